@@ -1,22 +1,41 @@
+from datetime import timedelta
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from djmoney.money import Money
 
 
 class ListingUnavailable(Exception):
     pass
 
 
+def get_cart(request):
+    """
+    Returns the cart for the current request, instantiating it from the
+    session on first access only, so that middleware, context processors
+    and views all share a single instance
+    """
+    if not hasattr(request, '_cached_cart'):
+        request._cached_cart = Cart(request.session)
+    return request._cached_cart
+
+
 class Cart:
     # Used to retrieve an existing session cart, if any
     key = getattr(settings, 'CART_KEY', 'CART')
+    # Expiry in seconds of the reservations of items in the cart
+    timeout = getattr(settings, 'CART_TIMEOUT', 3600)
 
-    def __init__(self, session):
+    def __init__(self, session, session_key=None):
         self.session = session  # Django request.session object
+        # Reservations are recorded against the session key. It can be passed
+        # explicitly when `session` is a decoded session dictionary
+        self._session_key = session_key
         self._items = {}  # Maps Listing pks to their prices
         if self.key in self.session:
             # If the key is already in the session, the cart exists and
             # must be rebuilt from the serialized items stored as its value
-            pks = self.session[self.key]
-            self._rebuild_cart(pks)
+            self._rebuild_cart(self.session[self.key])
 
     def __iter__(self):
         for instance in self.from_db():
@@ -44,14 +63,44 @@ class Cart:
     def items(self):
         return self._items.keys()
 
-    def _rebuild_cart(self, pks):
+    @property
+    def session_key(self):
+        return self._session_key or getattr(self.session, 'session_key', None)
+
+    @property
+    def reserved_until(self):
+        return timezone.now() + timedelta(seconds=self.timeout)
+
+    def _rebuild_cart(self, serialized):
         """
-        If the cart has been stored in the session, rebuild the cart using
-        the Listing instance pks stored therein
+        If the cart has been stored in the session, rebuild the cart from the
+        price snapshot stored therein, without touching the db. Carts
+        serialized as a plain list of Listing instance pks (i.e. before prices
+        were stored in the session) are rebuilt with a single query
         """
-        for pk in pks:
-            instance = self.query_db(pk)
-            self.add(instance, existing=True)
+        if isinstance(serialized, dict):
+            self._items = self.deserialize(serialized)
+        else:
+            self.refresh(serialized)
+
+    def refresh(self, pks=None):
+        """
+        Reloads the prices of the Listing instances with the given pks (by
+        default those currently in the cart) using a single query, dropping
+        any that no longer exist, and updates the session
+        """
+        from listings.models import Listing
+        if pks is None:
+            pks = [*self.items]
+        prices = {
+            pk: Money(amount, currency)
+            for pk, amount, currency in Listing.objects.filter(
+                id__in=pks
+            ).values_list('id', 'price', 'price_currency')
+        }
+        # Preserve the order in which items were added to the cart
+        self._items = {pk: prices[pk] for pk in pks if pk in prices}
+        self.update()
 
     def update(self):
         """
@@ -73,36 +122,41 @@ class Cart:
             id__in=[*self.items]
         )
 
-    def query_db(self, pk):
+    def add(self, instance):
         """
-        Retrieves the Listing instance associated with the pk passed as a
-        parameter
-        """
-        from listings.models import Listing
-        return Listing.objects.get(pk=pk)
-
-    def add(self, instance, existing=False):
-        """
-        To add individual Listing instances to the cart's items. It first
-        performs some checks - if the the instance's pk is already in the
-        cart, it simply returns; if the instance is sold AND does not exist
-        in the cart's serialized representation as indicated by the `existing`
-        kwarg, it raises an exception that will ultimately percolate up into a
-        404 error on the client side; finally, if the Listing instance is not
-        in the serialized cart, it is marked as sold; the listing is then added
-        to the cart's items
+        To add individual Listing instances to the cart's items. If the
+        instance's pk is already in the cart, it simply returns. Otherwise the
+        instance is reserved by marking it as sold with a conditional UPDATE
+        at the db level; if it was already sold (including by a concurrent
+        request), it raises an exception that will ultimately percolate up
+        into a 404 error on the client side. Successful reservations are
+        recorded in the Reservation ledger so that they expire if the cart is
+        abandoned
         Since each Listing instance is unique, checking that it is not
-        already sold is necessary
+        already sold is necessary. Doing so in the UPDATE itself rather than
+        by checking the instance ensures that two clients can't both reserve
+        the same instance
         """
+        from listings.models import Listing
+        from .models import Reservation
         if instance.pk in self.items:
             return
-        if instance.sold and not existing:
-            raise ListingUnavailable(
-                'This listing is not longer available'
+        if self.session_key is None:
+            # New sessions are only given a key once saved
+            self.session.save()
+        with transaction.atomic():
+            if not Listing.objects.filter(pk=instance.pk).reserve():
+                raise ListingUnavailable(
+                    'This listing is not longer available'
+                )
+            Reservation.objects.update_or_create(
+                listing_id=instance.pk,
+                defaults={
+                    'session_key': self.session_key,
+                    'reserved_until': self.reserved_until,
+                }
             )
-        if not existing:
-            instance.sold = True
-            instance.save()
+        instance.sold = True
 
         self._items.update({
             instance.pk: instance.price
@@ -112,35 +166,82 @@ class Cart:
     def remove(self, instance):
         """
         If the Listing instance's pk is not in in the cart's items, simply
-        returns to avoid unnecessary db call and Celery search_vector update
-        task. Otherwise unmarks the items as sold and removes the associated
-        key from the cart's item dictionary
+        returns to avoid an unnecessary db call. Otherwise unmarks the item as
+        sold and removes the associated key from the cart's item dictionary
         """
         if instance.pk not in self.items:
             return
+        self.release([instance.pk])
         instance.sold = False
-        instance.save()
-        self._items.pop(instance.pk)
-        self.update()
 
     def clear(self):
         """
-        Removes all items in the cart by calling the `remove` method for each
-        item. This is necessary since each item will have to be marked as
-        unsold, which requires a db call
+        Removes all items in the cart, returning them to stock
+        """
+        self.release([*self.items])
+
+    def release(self, pks):
+        """
+        Unmarks the Listing instances with the given pks as sold using a
+        single UPDATE, rather than saving each instance, and deletes their
+        reservations, then removes them from the cart's items and updates the
+        session once. Instances whose reservation has expired and which have
+        since been reserved by another session are not released
         """
-        items = self._items.copy()
-        for item in items:
-            instance = self.query_db(item)
-            self.remove(instance)
+        from .models import Reservation
+        if pks:
+            Reservation.objects.release([self.session_key], pks)
+        for pk in pks:
+            self._items.pop(pk, None)
         self.update()
 
+    def verify(self):
+        """
+        Removes the items whose reservation is no longer held by the cart's
+        session, e.g. because it expired and the item was released by the
+        sweeper and placed in another cart, while the session's snapshot
+        still lists it. Returns the pks of the removed items
+        """
+        from .models import Reservation
+        held = set(Reservation.objects.filter(
+            session_key=self.session_key, listing_id__in=[*self.items]
+        ).values_list('listing_id', flat=True))
+        lost = [pk for pk in self.items if pk not in held]
+        if lost:
+            # Only releases items without any reservation or order
+            self.release(lost)
+        return lost
+
+    def touch(self):
+        """
+        Extends the reservations of the items in the cart following client
+        activity
+        """
+        from .models import Reservation
+        Reservation.objects.filter(
+            session_key=self.session_key, listing_id__in=[*self.items]
+        ).update(reserved_until=self.reserved_until)
+
     def serialize(self):
         """
-        Produces a list of Listing instance pks. This will be stored as a
-        representation of the cart in the session in order to rebuild the cart
-        on subsequent requests. Can't use the `items` attribute directly,
-        since dict keys can't be pickled. It only serializes instance pks as
-        Money objects cannot be pickled
+        Produces a snapshot of the cart mapping Listing instance pks to their
+        prices. This will be stored as a representation of the cart in the
+        session in order to rebuild the cart on subsequent requests without
+        querying the db. Money objects can't be serialized to JSON, so each
+        price is stored as an amount and currency pair. Keys are cast to
+        strings, as the session serializer would do so anyway
+        """
+        return {
+            str(pk): [str(price.amount), str(price.currency)]
+            for pk, price in self._items.items()
+        }
+
+    @staticmethod
+    def deserialize(serialized):
+        """
+        Rebuilds the cart's items from the snapshot produced by `serialize`
         """
-        return [item for item in self._items]
+        return {
+            int(pk): Money(amount, currency)
+            for pk, (amount, currency) in serialized.items()
+        }
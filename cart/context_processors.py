@@ -1,9 +1,9 @@
-from .cart import Cart
+from common.utils import lazy_context
+from .cart import get_cart
 
 
 def cart(request):
-    cart = Cart(request.session)
-
+    # Lazy, so that templates which never use the cart don't build it
     return {
-        'cart': cart
+        'cart': lazy_context(request, 'cart', lambda: get_cart(request))
     }
@@ -0,0 +1,77 @@
+from django.db import models, connection
+from django.utils import timezone
+
+
+class ReservationQuerySet(models.QuerySet):
+    def expired(self):
+        return self.filter(reserved_until__lte=timezone.now())
+
+
+class ReservationManager(models.Manager.from_queryset(ReservationQuerySet)):
+    def release(self, session_keys, listing_ids):
+        """
+        Deletes the given sessions' reservations of the Listing instances with
+        the given pks and returns those instances to stock, in a single
+        statement. Only instances reserved by the given sessions are released,
+        so that an instance whose reservation has expired, and which has since
+        been placed in another cart or paid for, isn't put back on sale.
+        Instances without any reservation or order, from carts predating
+        reservations, are released as well
+        """
+        from listings.models import Listing
+        from listings.cache import bump_catalog_version
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''
+                WITH released AS (
+                    DELETE FROM {self.model._meta.db_table}
+                    WHERE session_key = ANY(%s) AND listing_id = ANY(%s)
+                    RETURNING listing_id
+                )
+                UPDATE {Listing._meta.db_table} AS listing
+                SET sold = false
+                WHERE listing.sold AND listing.id = ANY(%s) AND (
+                    listing.id IN (SELECT listing_id FROM released)
+                    OR (
+                        listing.order_id IS NULL AND NOT EXISTS (
+                            SELECT 1 FROM {self.model._meta.db_table}
+                            WHERE listing_id = listing.id
+                        )
+                    )
+                )
+                ''',
+                [list(session_keys), list(listing_ids), list(listing_ids)]
+            )
+            released = cursor.rowcount
+        if released:
+            bump_catalog_version()
+        return released
+
+    def release_expired(self):
+        """
+        Deletes all expired reservations and returns the associated Listing
+        instances to stock in a single statement. Uses the index on
+        `reserved_until`, so the cost depends only on the number of expired
+        reservations
+        """
+        from listings.models import Listing
+        from listings.cache import bump_catalog_version
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''
+                WITH expired AS (
+                    DELETE FROM {self.model._meta.db_table}
+                    WHERE reserved_until <= %s
+                    RETURNING listing_id
+                )
+                UPDATE {Listing._meta.db_table} AS listing
+                SET sold = false
+                FROM expired
+                WHERE listing.id = expired.listing_id AND listing.sold
+                ''',
+                [timezone.now()]
+            )
+            released = cursor.rowcount
+        if released:
+            bump_catalog_version()
+        return released
@@ -1,7 +1,8 @@
 import time
 from django.contrib import messages
 from django.conf import settings
-from .cart import Cart
+from django.utils.functional import SimpleLazyObject
+from .cart import Cart, get_cart
 
 
 class CartTimeoutMiddleware:
@@ -16,30 +17,45 @@ class CartTimeoutMiddleware:
         self.get_response = get_response
         # Cart expiry in seconds, default one hour
         self.timeout = getattr(settings, 'CART_TIMEOUT', 3600)
+        # Minimum interval in seconds between activity timestamp updates
+        self.refresh = getattr(settings, 'CART_TIMEOUT_REFRESH', 60)
         # Key to store serialized cart items in session
         self.key = getattr(settings, 'CART_TIMEOUT_KEY', 'CART_TIMEOUT')
 
     def __call__(self, request):
         """
-        Instantiate the cart using the session and check check the epoch
-        timestamp, clearing the cart and redirecting if expired, otherwise
-        refreshing the timestamp
+        Attach a lazily instantiated cart to the request, shared by the
+        views, context processors and subsequent middleware. After the
+        response, if the client has a cart, check the epoch timestamp,
+        clearing the cart and redirecting if expired, otherwise refreshing the
+        timestamp and extending the reservations of the items in the cart
+
+        Clients without a cart are left alone, so that browsing the site
+        doesn't create sessions, and the timestamp is only refreshed once per
+        `CART_TIMEOUT_REFRESH` seconds, so that successive requests don't
+        each write to the session
 
         NOTE Since the session is modified directly, this also has the side
         effect of resetting the session expiry
         """
+        request.cart = SimpleLazyObject(lambda: get_cart(request))
         response = self.get_response(request)
-        timestamp = request.session.setdefault(self.key, time.time())
-
-        cart = Cart(request.session)
-
-        if not cart.is_empty:
-            if time.time() - timestamp > self.timeout:
-                cart.clear()
-                messages.warning(
-                    request,
-                    'Your cart was automatically cleared due to inactivity'
-                )
+        session = request.session
+
+        if Cart.key not in session:
+            return response
+
+        timestamp = session.get(self.key, time.time())
+        expired = time.time() - timestamp > self.timeout
+        if expired and not request.cart.is_empty:
+            request.cart.clear()
+            messages.warning(
+                request,
+                'Your cart was automatically cleared due to inactivity'
+            )
+            session[self.key] = time.time()
+        elif self.key not in session or time.time() - timestamp > self.refresh:
+            session[self.key] = time.time()
+            request.cart.touch()
 
-        request.session[self.key] = time.time()
         return response
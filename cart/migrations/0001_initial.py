@@ -0,0 +1,25 @@
+# Generated by Django 3.0.7 on 2026-10-18 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('listings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reservation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(db_index=True, max_length=40)),
+                ('reserved_until', models.DateTimeField(db_index=True)),
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='listings.Listing')),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import models
+from .managers import ReservationManager
+
+
+class Reservation(models.Model):
+    """
+    Ledger of Listing instances currently held in session carts. Since each
+    Listing instance is unique, reservations expire after a period of
+    inactivity so that abandoned carts return items to stock, independently
+    of the sessions themselves
+    """
+    listing = models.OneToOneField(
+        'listings.Listing', on_delete=models.CASCADE
+    )
+    session_key = models.CharField(max_length=40, db_index=True)
+    reserved_until = models.DateTimeField(db_index=True)
+
+    objects = ReservationManager()
+
+    def __repr__(self):
+        return f"Reservation('{self.listing_id}', '{self.reserved_until}')"
+
+    def __str__(self):
+        return f'{self.listing_id} until {self.reserved_until}'
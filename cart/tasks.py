@@ -0,0 +1,13 @@
+from celery.decorators import periodic_task
+from celery.schedules import crontab
+from .models import Reservation
+
+
+@periodic_task(run_every=crontab())
+def release_expired_reservations():
+    """
+    Returns items held in abandoned carts to inventory as soon as their
+    reservation expires, rather than waiting for the owner's next request
+    or the expired session to be cleared
+    """
+    Reservation.objects.release_expired()
@@ -1,9 +1,15 @@
 import time
+from datetime import timedelta
+from unittest.mock import patch
 from django.test import TestCase, override_settings
+from django.utils import timezone
 from django.urls import reverse
 from django.conf import settings
 from cart.cart import Cart, ListingUnavailable
+from cart.models import Reservation
+from cart.tasks import release_expired_reservations
 from listings.models import Listing
+from shop.models import Order
 
 
 class CartTestCase(TestCase):
@@ -47,10 +53,59 @@ class CartSessionTestCase(CartTestCase):
         cart = Cart(session)
         cart.add(listing)
         self.assertIsNotNone(session[cart.key])
-        self.assertIn(listing.pk, session[cart.key])
+        self.assertIn(str(listing.pk), session[cart.key])
         cart.clear()
         self.assertFalse(session[cart.key])
 
+    def test_clear_bulk_release(self):
+        """
+        Test that clearing a cart returns every item to stock with a single
+        query
+        """
+        listings = Listing.objects.all()[:2]
+        session = self.client.session
+        cart = Cart(session)
+        for listing in listings:
+            cart.add(listing)
+        with self.assertNumQueries(1):
+            cart.clear()
+        self.assertTrue(cart.is_empty)
+        self.assertFalse(
+            Listing.objects.filter(
+                id__in=[listing.pk for listing in listings], sold=True
+            ).exists()
+        )
+
+    def test_rebuild_from_snapshot(self):
+        """
+        Test that a cart rebuilt from the price snapshot stored in the session
+        does not query the db
+        """
+        listing = Listing.objects.first()
+        session = self.client.session
+        Cart(session).add(listing)
+        with self.assertNumQueries(0):
+            cart = Cart(session)
+            self.assertEqual(1, cart.count)
+            self.assertEqual(listing.price, cart.total)
+            self.assertFalse(cart.is_empty)
+
+    def test_rebuild_from_pks(self):
+        """
+        Test that carts serialized as a list of pks are rebuilt with a single
+        query and converted to the price snapshot
+        """
+        listings = Listing.objects.all()[:2]
+        session = self.client.session
+        session[Cart.key] = [listing.pk for listing in listings]
+        with self.assertNumQueries(1):
+            cart = Cart(session)
+        self.assertEqual(2, cart.count)
+        self.assertEqual(
+            sum(listing.price for listing in listings), cart.total
+        )
+        self.assertIsInstance(session[Cart.key], dict)
+
     def test_cart_raises(self):
         """
         Test raising an exception by trying to add a sold Listing instance to
@@ -72,6 +127,112 @@ class CartSessionTestCase(CartTestCase):
         with self.assertRaises(ListingUnavailable):
             cart2.add(listing)
 
+    def test_cart_raises_stale_instance(self):
+        """
+        Test that reservation is decided by the db rather than the instance,
+        so that a client holding a stale unsold instance can't reserve a
+        Listing that has already been added to another cart
+        """
+        listing = Listing.objects.first()
+        stale = Listing.objects.get(pk=listing.pk)
+        cart1 = Cart(self.client.session)
+        cart1.add(listing)
+        self.assertFalse(stale.sold)
+        cart2 = Cart({}, session_key='test')
+        with self.assertRaises(ListingUnavailable):
+            cart2.add(stale)
+        self.assertTrue(cart2.is_empty)
+        self.assertTrue(Listing.objects.get(pk=listing.pk).sold)
+
+
+class ReservationTestCase(CartTestCase):
+    def setUp(self):
+        self.listing = Listing.objects.first()
+        self.session = self.client.session
+        self.cart = Cart(self.session)
+        self.cart.add(self.listing)
+
+    def test_reservation_ledger(self):
+        """
+        Test that adding an item to the cart records a reservation for the
+        session, and that removing it deletes the reservation
+        """
+        reservation = Reservation.objects.get(listing=self.listing)
+        self.assertEqual(reservation.session_key, self.session.session_key)
+        self.assertGreater(reservation.reserved_until, timezone.now())
+        self.cart.remove(self.listing)
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_release_expired(self):
+        """
+        Test that expired reservations are deleted and their items returned
+        to stock by the periodic task
+        """
+        Reservation.objects.update(
+            reserved_until=timezone.now() - timedelta(minutes=1)
+        )
+        release_expired_reservations()
+        self.assertFalse(Reservation.objects.exists())
+        self.assertFalse(Listing.objects.get(pk=self.listing.pk).sold)
+
+    def test_release_reserved_elsewhere(self):
+        """
+        Test that clearing a cart whose reservation has expired doesn't
+        release an item that has since been reserved by another session
+        """
+        Reservation.objects.update(
+            reserved_until=timezone.now() - timedelta(minutes=1)
+        )
+        release_expired_reservations()
+        other = Cart({}, session_key='other')
+        other.add(Listing.objects.get(pk=self.listing.pk))
+        self.cart.clear()
+        self.assertTrue(Listing.objects.get(pk=self.listing.pk).sold)
+        self.assertEqual(
+            Reservation.objects.get(listing=self.listing).session_key, 'other'
+        )
+
+    def test_release_paid_elsewhere(self):
+        """
+        Test that clearing a cart whose reservation has expired doesn't
+        release an item that has since been paid for by another session
+        """
+        Reservation.objects.update(
+            reserved_until=timezone.now() - timedelta(minutes=1)
+        )
+        release_expired_reservations()
+        other = Cart({}, session_key='other')
+        other.add(Listing.objects.get(pk=self.listing.pk))
+        order = Order.objects.create(
+            first_name='Test', last_name='Test', email='test@test.com',
+            phone='(555) 555-5555', street_address='123 Test St',
+            city='Test', state='AK', zip_code='55555'
+        )
+        order.add_from_cart(other)
+        order.finalize({settings.CART_KEY: {}, settings.ORDER_KEY: {}})
+        self.assertFalse(Reservation.objects.exists())
+        self.cart.clear()
+        self.assertTrue(Listing.objects.get(pk=self.listing.pk).sold)
+
+    def test_verify(self):
+        """
+        Test that items reserved by another session since the cart's
+        reservation expired are removed from the cart, and left reserved
+        """
+        Reservation.objects.update(
+            reserved_until=timezone.now() - timedelta(minutes=1)
+        )
+        release_expired_reservations()
+        other = Cart({}, session_key='other')
+        other.add(Listing.objects.get(pk=self.listing.pk))
+        cart = Cart(self.session)
+        self.assertEqual(cart.verify(), [self.listing.pk])
+        self.assertTrue(cart.is_empty)
+        self.assertTrue(Listing.objects.get(pk=self.listing.pk).sold)
+        self.assertEqual(
+            Reservation.objects.get(listing=self.listing).session_key, 'other'
+        )
+
 
 class CartViewTestCase(CartTestCase):
     def test_cart_add_remove_view(self):
@@ -85,7 +246,7 @@ class CartViewTestCase(CartTestCase):
         )
         self.assertRedirects(response, '/')
         session = self.client.session
-        self.assertIn(listing.pk, session[Cart.key])
+        self.assertIn(str(listing.pk), session[Cart.key])
 
         # Test if removing an item with a non-empty cart correctly redirects
         # back to the cart status view
@@ -128,6 +289,24 @@ class CartViewTestCase(CartTestCase):
         self.assertFalse(cart.items)
         self.assertFalse(session[Cart.key])
 
+    def test_request_cart(self):
+        """
+        Test that the views, context processors and middleware share a single
+        cart instance attached to the request
+        """
+        listing = Listing.objects.first()
+        self.client.post(
+            reverse('cart:add'), {'listing': listing.slug}
+        )
+        with patch.object(
+            Cart, '__init__', autospec=True, side_effect=Cart.__init__
+        ) as init:
+            response = self.client.get(reverse('cart:status'))
+        self.assertEqual(1, init.call_count)
+        request = response.wsgi_request
+        self.assertIn(listing.pk, request.cart)
+        self.assertEqual(1, response.context['cart'].count)
+
     def test_bad_post_redirect(self):
         """
         Test if adding non-existent Listing raises Http404 exception
@@ -144,14 +323,41 @@ class CartMiddlewareTestCase(CartTestCase):
     """
     def test_timestamp(self):
         """
-        Test that timestamp to measure activity is stored in session
+        Test that timestamp to measure activity is stored in session once the
+        client has a cart
         """
         session_key = settings.CART_TIMEOUT_KEY
         self.client.get('/')
+        self.assertNotIn(session_key, self.client.session)
+        listing = Listing.objects.first()
+        self.client.post(
+            reverse('cart:add'), {'listing': listing.slug}
+        )
         session = self.client.session
         self.assertTrue(session[session_key])
         self.assertLess(session[session_key], time.time())
 
+    def test_no_session(self):
+        """
+        Test that browsing without a cart doesn't create a session
+        """
+        response = self.client.get('/')
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+    @override_settings(CART_TIMEOUT_REFRESH=3600)
+    def test_timestamp_coalesced(self):
+        """
+        Test that the timestamp isn't rewritten on every request
+        """
+        session_key = settings.CART_TIMEOUT_KEY
+        listing = Listing.objects.first()
+        self.client.post(
+            reverse('cart:add'), {'listing': listing.slug}
+        )
+        timestamp = self.client.session[session_key]
+        self.client.get(reverse('cart:status'))
+        self.assertEqual(timestamp, self.client.session[session_key])
+
     @override_settings(CART_TIMEOUT=0)
     def test_cart_timeout(self):
         """
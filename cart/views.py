@@ -6,7 +6,7 @@ from django.http import Http404
 from django.template.response import TemplateResponse
 from django.utils.safestring import mark_safe
 from listings.models import Listing
-from .cart import Cart, ListingUnavailable
+from .cart import ListingUnavailable
 
 
 def emphasize(listing_name):
@@ -19,7 +19,7 @@ class CartViewMixin(View):
 
     def setup(self, request, *args, **kwargs):
         super().setup(request, *args, **kwargs)
-        self.cart = Cart(self.request.session)
+        self.cart = request.cart
 
 
 class CartAddView(CartViewMixin):
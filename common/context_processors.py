@@ -1,14 +1,24 @@
 from djmoney.money import Money
 from listings.models import Category
+from .utils import lazy_context
+
+# Context values are lazily evaluated, so that templates which don't render
+# them, e.g. error pages and emails, don't compute them
 
 
 def in_stock(request):
     return {
-        'categories_in_stock': Category.objects.in_stock()
+        'categories_in_stock': lazy_context(
+            request, 'in_stock', Category.objects.get_in_stock
+        )
     }
 
 
 def price_points(request):
     return {
-        'prices': [Money(i, 'USD') for i in range(100, 400, 100)]
+        'prices': lazy_context(
+            request,
+            'price_points',
+            lambda: [Money(i, 'USD') for i in range(100, 400, 100)]
+        )
     }
@@ -0,0 +1,119 @@
+import posixpath
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+
+# Formats of the resized derivatives, by file extension. Metadata such as
+# EXIF isn't written unless passed to `Image.save`, so it is stripped
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+    'jpg': ('JPEG', {'quality': 80, 'optimize': True, 'progressive': True}),
+}
+
+
+def derivative_name(name, width, extension):
+    """
+    Returns the storage name of a derivative of the picture with the given
+    name, e.g. `listings/derivatives/pendant_pendant-320w.webp`
+    """
+    directory, filename = posixpath.split(posixpath.splitext(name)[0])
+    return posixpath.join(
+        directory, 'derivatives', f'{filename}-{width}w.{extension}'
+    )
+
+
+def generate_derivatives(picture):
+    """
+    Saves resized copies of the picture, in every format, for each of the
+    `PICTURE_WIDTHS` smaller than the picture. Returns the widths generated
+    """
+    with picture.open('rb'):
+        # Applies the EXIF orientation, which is lost when it's stripped
+        image = ImageOps.exif_transpose(Image.open(picture))
+    image = image.convert('RGB')
+
+    widths = []
+    for width in sorted(settings.PICTURE_WIDTHS):
+        if width >= image.width:
+            break
+        height = round(image.height * width / image.width)
+        resized = image.resize((width, height), Image.LANCZOS)
+        for extension, (format, options) in FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, format, **options)
+            name = derivative_name(picture.name, width, extension)
+            # Otherwise storages would save under a different name
+            picture.storage.delete(name)
+            picture.storage.save(name, ContentFile(buffer.getvalue()))
+        widths.append(width)
+    return widths
+
+
+def get_srcset(picture, widths, extension):
+    """
+    Returns the `srcset` attribute value for the picture's derivatives in
+    the given format
+    """
+    srcset = []
+    for width in widths:
+        name = derivative_name(picture.name, width, extension)
+        srcset.append(f'{picture.storage.url(name)} {width}w')
+    return ', '.join(srcset)
+
+
+# Signal receivers for models with `picture` and `picture_widths` fields,
+# connected in the models' modules
+
+def reset_derivatives(sender, instance, raw=False, **kwargs):
+    """
+    Clears the widths of the derivatives when a new picture is uploaded, so
+    that the previous picture's derivatives aren't served in the meantime.
+    These are deleted once the instance has been committed
+    """
+    if raw:
+        return
+    if instance.picture and not instance.picture._committed:
+        previous = instance.pk and sender.objects.filter(
+            pk=instance.pk
+        ).values_list('picture', 'picture_widths').first()
+        if previous and previous[1]:
+            storage = instance.picture.storage
+            transaction.on_commit(
+                lambda: remove_derivatives(storage, *previous)
+            )
+        instance.picture_widths = None
+        instance._picture_uploaded = True
+
+
+def schedule_derivatives(sender, instance, raw=False, **kwargs):
+    """
+    Generates the derivatives of a newly uploaded picture in a Celery task,
+    once the instance has been committed
+    """
+    if raw or not getattr(instance, '_picture_uploaded', False):
+        return
+    from .tasks import generate_picture_derivatives
+    del instance._picture_uploaded
+    label, pk = instance._meta.label, instance.pk
+    transaction.on_commit(
+        lambda: generate_picture_derivatives.delay(label, pk)
+    )
+
+
+def remove_derivatives(storage, name, widths):
+    """
+    Deletes the derivatives of the picture with the given name from storage
+    """
+    for width in widths:
+        for extension in FORMATS:
+            storage.delete(derivative_name(name, width, extension))
+
+
+def delete_derivatives(sender, instance, **kwargs):
+    remove_derivatives(
+        instance.picture.storage, instance.picture.name,
+        instance.picture_widths or []
+    )
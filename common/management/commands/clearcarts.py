@@ -1,7 +1,9 @@
+import time
 from django.core.management.base import BaseCommand
 from django.contrib.sessions.models import Session
 from django.utils import timezone
 from cart.cart import Cart
+from cart.models import Reservation
 
 
 class Command(BaseCommand):
@@ -11,16 +13,76 @@ class Command(BaseCommand):
     `clearsessions` management command. An alternative would be performing both
     tasks independently, however clearing carts on sessions would require
     modifiying SessionStore objects outside of the view/response context.
+    Expired sessions are streamed in chunks ordered by session key, so that
+    memory use is bounded by the batch size; the carts' items are released and
+    the sessions deleted in bulk for each chunk
     """
     help = 'Clears expired sessions and their associated carts'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of expired sessions to process at once',
+        )
+
     def handle(self, *args, **options):
-        sessions = Session.objects.filter(expire_date__lte=timezone.now())
-        for session in sessions:
-            session_data = session.get_decoded()
-            cart = Cart(session_data)
-            cart.clear()
-            session.delete()
+        batch_size = options['batch_size']
+        now = timezone.now()
+        # Only used to decode session data, no session is loaded
+        store = Session.get_session_store_class()()
+        start = time.monotonic()
+        sessions = released = 0
+        last_key = ''
+
+        while True:
+            # Keyset pagination, avoiding an increasingly expensive OFFSET
+            chunk = list(
+                Session.objects.filter(
+                    expire_date__lte=now, session_key__gt=last_key
+                ).order_by('session_key').values_list(
+                    'session_key', 'session_data'
+                )[:batch_size]
+            )
+            if not chunk:
+                break
+            session_keys = [session_key for session_key, _ in chunk]
+            last_key = session_keys[-1]
+
+            pks = self.get_cart_items(store, chunk)
+            pks.update(
+                Reservation.objects.filter(
+                    session_key__in=session_keys
+                ).values_list('listing_id', flat=True)
+            )
+            if pks:
+                released += Reservation.objects.release(session_keys, pks)
+            Session.objects.filter(session_key__in=session_keys).delete()
+
+            sessions += len(chunk)
+            if options['verbosity'] > 0:
+                elapsed = time.monotonic() - start
+                self.stdout.write(
+                    f'Cleared {sessions} sessions and released {released} '
+                    f'listings ({sessions / elapsed:.0f} sessions/s)'
+                )
+
         self.stdout.write(self.style.SUCCESS(
             'Successfully cleared expired sessions and associated carts'
         ))
+
+    @staticmethod
+    def get_cart_items(store, chunk):
+        """
+        Collects the pks of the Listing instances in the serialized carts of
+        the given sessions. Sessions without a cart are skipped rather than
+        instantiating a Cart for each of them
+        """
+        pks = set()
+        for _, session_data in chunk:
+            serialized = store.decode(session_data).get(Cart.key)
+            if serialized:
+                # Either a price snapshot keyed by pk or a list of pks
+                pks.update(int(pk) for pk in serialized)
+        return pks
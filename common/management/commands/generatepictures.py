@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from listings.models import Listing
+from common.models import Slide
+from common.tasks import generate_picture_derivatives
+
+
+class Command(BaseCommand):
+    """
+    Queues the generation of resized picture derivatives for Listing and
+    Slide instances for which it hasn't been attempted yet, e.g. those
+    uploaded before derivatives were introduced or loaded from fixtures.
+    Pictures too small for any derivative aren't queued again
+    """
+    help = 'Generates missing resized derivatives of uploaded pictures'
+
+    def handle(self, *args, **options):
+        queued = 0
+        for model in (Listing, Slide):
+            pks = model.objects.filter(picture_widths=None).values_list(
+                'pk', flat=True
+            )
+            for pk in pks.iterator():
+                generate_picture_derivatives.delay(model._meta.label, pk)
+                queued += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully queued {queued} pictures'
+        ))
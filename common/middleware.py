@@ -1,3 +1,5 @@
+import time
+import logging
 from django.conf import settings
 from django.shortcuts import redirect, reverse
 from django.contrib import messages
@@ -8,6 +10,41 @@ from geoip2.errors import AddressNotFoundError
 from ipware import get_client_ip
 
 
+logger = logging.getLogger(__name__)
+
+
+class ServerTimingMiddleware:
+    """
+    Middleware reporting a per-request timing breakdown: the total time
+    taken by the view and the time taken to evaluate each lazy context
+    processor value, see `common.utils.lazy_context`. The timings are logged
+    at debug level and, if `SERVER_TIMING` is set (defaults to `DEBUG`),
+    sent in a `Server-Timing` header, which browsers' dev tools display
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = getattr(settings, 'SERVER_TIMING', settings.DEBUG)
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        timings = {
+            'total': time.perf_counter() - start,
+            **getattr(request, 'context_timings', {})
+        }
+        logger.debug('%s %s', request.path, ', '.join(
+            f'{name} {duration * 1000:.1f}ms'
+            for name, duration in timings.items()
+        ))
+        if self.header:
+            response['Server-Timing'] = ', '.join(
+                f'{name};dur={duration * 1000:.1f}'
+                for name, duration in timings.items()
+            )
+        return response
+
+
 class GeoIPMiddleware:
     """
     Middleware to detect client ip and redirect from restricted views if
@@ -38,8 +75,6 @@ class GeoIPMiddleware:
             raise MiddlewareNotUsed('GeoIP2 data failed to load')
 
     def __call__(self, request):
-        # Save the session for `process_view`
-        self.session = request.session
         return self.get_response(request)
 
     def process_view(self, request, view_func, view_args, view_kwargs):
@@ -65,8 +100,7 @@ class GeoIPMiddleware:
         if client_ip is None or not is_routable:
             return
 
-        data = self.session.get(self.key)
-        country = self.verify_country(data, client_ip)
+        country = self.verify_country(request.session, client_ip)
         if country is not None and country not in self.whitelist:
             # If the country has been established and is not in whitelist,
             # flash message about shipping and payment policy and redirect to
@@ -82,25 +116,22 @@ class GeoIPMiddleware:
             return redirect(reverse('index'))
         return
 
-    def verify_country(self, data, client_ip):
+    def verify_country(self, session, client_ip):
         """
         Checks the session for existing client data. If the country has not
         previously been stored in the session, checks the GeoIP database.
         Returns either the country code or None.
         """
-        if data is None:
-            country = self.get_country_code(client_ip)
-            # Store client data in session to retrive it on next request,
-            # rather than calling an expensive GeoIP method on each request
-            self.update(country, client_ip)
-        else:
+        data = session.get(self.key)
+        if data is not None:
             stored_country, stored_ip = data
-            # If ip has changed, update the session with new ip and country
-            if stored_ip != client_ip:
-                country = self.get_country_code(client_ip)
-                self.update(client_ip, country)
-            else:
+            if stored_ip == client_ip:
                 return stored_country
+        # Either no client data is stored or the ip has changed
+        country = self.get_country_code(client_ip)
+        # Store client data in session to retrive it on next request,
+        # rather than calling an expensive GeoIP method on each request
+        self.update(session, country, client_ip)
         return country
 
     def get_country_code(self, client_ip):
@@ -113,9 +144,12 @@ class GeoIPMiddleware:
         except AddressNotFoundError:
             return
 
-    def update(self, client_ip, country):
+    def update(self, session, country, client_ip):
         """
-        Inserts a list with the client ip and country into the session
-        dictionart
+        Inserts a list with the client country and ip into the session
+        dictionary. Sessions that don't exist yet are not created just to
+        store client data; the country is simply looked up again
         """
-        self.session[self.key] = [client_ip, country]
+        if session.is_empty():
+            return
+        session[self.key] = [country, client_ip]
@@ -1,7 +1,10 @@
 from django.db import models
+from django.db.models import signals
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.fields import ArrayField
 from django.core.validators import RegexValidator
 from solo.models import SingletonModel
+from . import images
 
 
 class User(AbstractUser):
@@ -49,6 +52,11 @@ class Slide(models.Model):
     """
     caption = models.CharField(max_length=255)
     picture = models.ImageField(upload_to=slide_upload_path)
+    # Widths of the generated derivatives of `picture`, see `common.images`.
+    # None until generation has been attempted, as small pictures have none
+    picture_widths = ArrayField(
+        models.IntegerField(), null=True, blank=True, editable=False
+    )
     carousel = models.ForeignKey(Carousel, on_delete=models.CASCADE)
 
     def __repr__(self):
@@ -56,3 +64,8 @@ class Slide(models.Model):
 
     def __str__(self):
         return self.caption
+
+
+signals.pre_save.connect(images.reset_derivatives, sender=Slide)
+signals.post_save.connect(images.schedule_derivatives, sender=Slide)
+signals.post_delete.connect(images.delete_derivatives, sender=Slide)
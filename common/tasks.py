@@ -1,3 +1,4 @@
+from django.apps import apps
 from django.core import management
 from django.contrib.sitemaps import ping_google
 from django.core.mail import mail_admins
@@ -5,6 +6,7 @@ from celery.decorators import periodic_task, task
 from celery.schedules import crontab
 from celery.utils.log import get_logger
 from html2text import html2text
+from .images import generate_derivatives
 
 
 logger = get_logger(__name__)
@@ -40,6 +42,24 @@ def notify_admins(subject, body, **kwargs):
     mail_admins(subject, message=plain_text, html_message=body, **kwargs)
 
 
+@task(name='generate_picture_derivatives')
+def generate_picture_derivatives(model, pk):
+    """
+    Generates the resized derivatives of the picture of a Listing or Slide
+    instance, given the model's label, e.g. `listings.Listing`, and records
+    their widths
+    """
+    Model = apps.get_model(model)
+    instance = Model.objects.filter(pk=pk).first()
+    if instance is None or not instance.picture:
+        return
+    widths = generate_derivatives(instance.picture)
+    # Only updates the widths if the picture hasn't since been replaced
+    Model.objects.filter(pk=pk, picture=instance.picture.name).update(
+        picture_widths=widths
+    )
+
+
 @periodic_task(run_every=crontab(minute=0, hour=0, day_of_month=1))
 def ping():
     """
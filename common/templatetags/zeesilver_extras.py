@@ -1,4 +1,5 @@
 from django import template
+from common.images import get_srcset
 
 
 register = template.Library()
@@ -14,6 +15,23 @@ def add_or_view(listing, size='fa-lg'):
     return {'listing': listing, 'size': size}
 
 
+@register.inclusion_tag('common/tags/picture.html')
+def picture(instance, sizes='100vw', **attrs):
+    """
+    Renders the picture of a Listing or Slide instance, with the srcsets of
+    its resized derivatives once these have been generated. Any keyword
+    arguments are rendered as attributes of the img element
+    """
+    widths = instance.picture_widths or []
+    return {
+        'picture': instance.picture,
+        'webp': get_srcset(instance.picture, widths, 'webp'),
+        'jpg': get_srcset(instance.picture, widths, 'jpg'),
+        'sizes': sizes,
+        'attrs': attrs,
+    }
+
+
 @register.inclusion_tag('common/tags/legend.html')
 def legend(text, *classes):
     return {
@@ -37,15 +55,17 @@ def filter_options(context, heading, **kwargs):
 
 
 @register.simple_tag
-def filter_href(category, price, order, page):
-    return (
-        f'?category={category}&price__lte={price}'
-        f'&order_by={order}&page={page}'
-    )
+def filter_href(category, price, order, page, cursor=''):
+    href = f'?category={category}&price__lte={price}&order_by={order}'
+    if cursor:
+        return f'{href}&cursor={cursor}'
+    return f'{href}&page={page}'
 
 
 @register.simple_tag
-def search_pagination_href(q, page=1):
+def search_pagination_href(q, page=1, cursor=''):
+    if cursor:
+        return f'?q={q}&cursor={cursor}'
     return f'?q={q}&page={page}'
 
 
@@ -1,14 +1,63 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from datetime import timedelta
+from unittest.mock import patch
+from PIL import Image
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
-from listings.models import Listing
+from django.core import management
+from django.contrib.sessions.models import Session
+from django.contrib.sessions.backends.db import SessionStore
+from django.utils import timezone
+from listings.models import Category, Listing
 from cart.cart import Cart
+from .images import derivative_name
+from .models import Carousel, Slide
+from .tasks import generate_picture_derivatives
 
 
 class IndexTestCase(TestCase):
+    fixtures = ['listings/fixtures/listings.yaml']
+
     def test_get(self):
         response = self.client.get(reverse('index'))
         self.assertEqual(response.status_code, 200)
 
+    def test_example_listings(self):
+        """
+        One example per in stock category, fetched with a single query
+        """
+        Listing.objects.filter(pk=2).reserve()
+        with self.assertNumQueries(1):
+            examples = [
+                (listing.pk, listing.category.name)
+                for listing in Category.objects.get_example_listings()
+            ]
+        self.assertEqual(
+            [(1, 'Pendants'), (3, 'Earrings'), (4, 'Bracelets')], examples
+        )
+
+
+@override_settings(SERVER_TIMING=True)
+class ServerTimingTestCase(TestCase):
+    fixtures = ['listings/fixtures/listings.yaml']
+
+    def test_context_timings(self):
+        response = self.client.get(reverse('listing:filter'))
+        timings = response['Server-Timing']
+        self.assertIn('total;dur=', timings)
+        self.assertIn('in_stock;dur=', timings)
+        self.assertIn('price_points;dur=', timings)
+
+    def test_unused_context(self):
+        """
+        Context values not rendered by the template shouldn't be evaluated
+        """
+        response = self.client.get(reverse('cart:status'))
+        self.assertNotIn('in_stock', response['Server-Timing'])
+
 
 class GeoIPTestCase(TestCase):
     fixtures = ['listings/fixtures/listings.yaml']
@@ -32,3 +81,117 @@ class GeoIPTestCase(TestCase):
             REMOTE_ADDR='199.187.211.102'
         )
         self.assertIn(self.listing.pk, self.cart)
+
+
+class ClearCartsTestCase(TestCase):
+    fixtures = ['listings/fixtures/listings.yaml']
+
+    def test_clear_expired(self):
+        """
+        Test that expired sessions are deleted in chunks and the items in
+        their carts returned to stock, without affecting active sessions
+        """
+        listings = Listing.objects.all()[:2]
+        for listing in listings:
+            session = SessionStore()
+            Cart(session).add(listing)
+            session.save()
+        # Session without a cart
+        SessionStore().create()
+        Session.objects.update(expire_date=timezone.now() - timedelta(days=1))
+        active = SessionStore()
+        active.create()
+
+        management.call_command('clearcarts', batch_size=2, stdout=StringIO())
+        self.assertEqual(
+            [active.session_key],
+            [*Session.objects.values_list('session_key', flat=True)]
+        )
+        self.assertFalse(
+            Listing.objects.filter(
+                id__in=[listing.pk for listing in listings], sold=True
+            ).exists()
+        )
+
+
+class PictureTestCase:
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        self.media_settings.enable()
+        # Landscape picture, rotated to portrait by its EXIF orientation
+        image = Image.new('RGB', (1000, 600))
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', exif=exif.tobytes())
+        self.slide = Slide.objects.create(
+            caption='Slide',
+            picture=SimpleUploadedFile('slide.jpg', buffer.getvalue()),
+            carousel=Carousel.get_solo(),
+        )
+
+    def tearDown(self):
+        self.media_settings.disable()
+        shutil.rmtree(self.media_root)
+
+
+@override_settings(PICTURE_WIDTHS=[320, 640, 1280])
+class PictureDerivativesTestCase(PictureTestCase, TestCase):
+
+    def test_generate_derivatives(self):
+        generate_picture_derivatives('common.Slide', self.slide.pk)
+        self.slide.refresh_from_db()
+        # Only widths narrower than the rotated picture are generated
+        self.assertEqual([320], self.slide.picture_widths)
+        for extension in ('webp', 'jpg'):
+            name = derivative_name(self.slide.picture.name, 320, extension)
+            with self.slide.picture.storage.open(name) as f:
+                derivative = Image.open(f)
+                self.assertEqual((320, 533), derivative.size)
+                self.assertNotIn('exif', derivative.info)
+
+    def test_new_picture(self):
+        """
+        Widths should be reset when a new picture is uploaded
+        """
+        generate_picture_derivatives('common.Slide', self.slide.pk)
+        self.slide.refresh_from_db()
+        self.slide.picture = SimpleUploadedFile(
+            'other.jpg', self.slide.picture.read()
+        )
+        self.slide.save()
+        self.assertIsNone(self.slide.picture_widths)
+
+    @override_settings(PICTURE_WIDTHS=[1280])
+    def test_small_picture(self):
+        """
+        Pictures too small for any derivative shouldn't be queued again
+        """
+        generate_picture_derivatives('common.Slide', self.slide.pk)
+        self.slide.refresh_from_db()
+        self.assertEqual([], self.slide.picture_widths)
+        with patch.object(generate_picture_derivatives, 'delay') as delay:
+            management.call_command('generatepictures', stdout=StringIO())
+        delay.assert_not_called()
+
+
+@override_settings(PICTURE_WIDTHS=[320, 640, 1280])
+class PictureReplacedTestCase(PictureTestCase, TransactionTestCase):
+    def test_previous_derivatives_deleted(self):
+        """
+        The previous picture's derivatives should be deleted once a new
+        picture has been committed
+        """
+        self.slide.refresh_from_db()
+        self.assertEqual([320], self.slide.picture_widths)
+        previous = derivative_name(self.slide.picture.name, 320, 'webp')
+        self.slide.picture = SimpleUploadedFile(
+            'other.jpg', self.slide.picture.read()
+        )
+        self.slide.save()
+        storage = self.slide.picture.storage
+        self.assertFalse(storage.exists(previous))
+        self.assertTrue(storage.exists(
+            derivative_name(self.slide.picture.name, 320, 'webp')
+        ))
@@ -1,5 +1,7 @@
 import os
+import time
 from django.contrib.sites.models import Site
+from django.utils.functional import SimpleLazyObject
 
 
 def get_site_name():
@@ -21,3 +23,20 @@ class cd:
 
     def __exit__(self, *args):
         os.chdir(self.original_path)
+
+
+def lazy_context(request, name, func):
+    """
+    Returns a lazy object for use in context processors, so that `func` is
+    only called if a template accesses the value. The time taken to evaluate
+    it is recorded in `request.context_timings`, see `ServerTimingMiddleware`
+    """
+    def evaluate():
+        start = time.perf_counter()
+        try:
+            return func()
+        finally:
+            request.__dict__.setdefault('context_timings', {})[name] = (
+                time.perf_counter() - start
+            )
+    return SimpleLazyObject(evaluate)
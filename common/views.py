@@ -7,7 +7,9 @@ def index(request):
     examples = Category.objects.get_example_listings()
     # Carousel is a singleton model
     carousel = Carousel.get_solo()
-    context = {'examples': examples, 'carousel': carousel}
+    # Evaluated once, rather than for both the indicators and the slides
+    slides = list(carousel.slide_set.all())
+    context = {'examples': examples, 'carousel': carousel, 'slides': slides}
     return render(request, 'common/index.html', context=context)
 
 
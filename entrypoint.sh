@@ -20,5 +20,7 @@ python -c "import django; django.setup(); \
     get_user_model().objects.create_superuser('$SU_USERNAME', '$SU_EMAIL', '$SU_PASSWORD')"
 python manage.py loaddata listings/fixtures/listings.yaml --settings=$DJANGO_SETTINGS_MODULE
 python manage.py loaddata common/fixtures/common.yaml --settings=$DJANGO_SETTINGS_MODULE
+python manage.py reindexsearch --verbosity 0 --settings=$DJANGO_SETTINGS_MODULE
+python manage.py generatepictures --settings=$DJANGO_SETTINGS_MODULE
 
 exec "$@"
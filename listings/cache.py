@@ -0,0 +1,180 @@
+import time
+import hashlib
+from decimal import Decimal
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+VERSION_KEY = 'catalog_version'
+
+
+def get_catalog_version():
+    """
+    Returns the current catalog version, which is included in the keys of
+    cached catalog query results so that they are invalidated whenever the
+    catalog changes. If the version has been evicted, a new one is started
+    from the current time, so that previous keys are never reused
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _incr_catalog_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Version has been evicted, start a new one
+        get_catalog_version()
+
+
+def bump_catalog_version():
+    """
+    Invalidates all cached catalog query results. Should be called whenever a
+    Listing instance is added, edited, reserved or sold. The version is
+    bumped again on commit, so that results cached by concurrent requests
+    before the change was visible to them are discarded too
+    """
+    _incr_catalog_version()
+    transaction.on_commit(_incr_catalog_version)
+
+
+def get_or_set(key, default):
+    """
+    Returns the value cached under the key for the current catalog version,
+    setting it by calling `default` if it isn't cached
+    """
+    return cache.get_or_set(
+        f'{key}:{get_catalog_version()}',
+        default,
+        getattr(settings, 'CATALOG_CACHE_TIMEOUT', 86400),
+    )
+
+
+def normalize(params):
+    """
+    Returns a canonical string representation of a dictionary of query
+    parameters, skipping empty values, for use in cache keys
+    """
+    normalized = {}
+    for key, value in params.items():
+        if value in (None, '', []):
+            continue
+        if isinstance(value, Decimal):
+            value = value.normalize()
+        normalized[key] = str(value).lower()
+    return urlencode(sorted(normalized.items()))
+
+
+def make_key(namespace, params):
+    digest = hashlib.md5(normalize(params).encode()).hexdigest()
+    return f'{namespace}:{get_catalog_version()}:{digest}'
+
+
+def get_cached_pks(namespace, params, queryset, limit=None):
+    """
+    Returns the ordered list of pks of the instances in the queryset, or of
+    the first `limit` instances, cached for the current catalog version and
+    the given query parameters
+    """
+    pks = queryset.values_list('pk', flat=True)
+    if limit is not None:
+        pks = pks[:limit]
+    return cache.get_or_set(
+        make_key(namespace, params),
+        lambda: list(pks),
+        getattr(settings, 'CATALOG_CACHE_TIMEOUT', 86400),
+    )
+
+
+def get_cached_count(namespace, params, queryset, limit=None):
+    """
+    Returns the number of instances in the queryset, counting at most
+    `limit` instances, cached for the current catalog version and the given
+    query parameters. Counts aren't cached if the params are None
+    """
+    if limit is not None:
+        # Counted in a subquery, which stops scanning once the limit is hit.
+        # Sliced subqueries keep their ordering, which isn't needed to count
+        queryset = queryset.order_by().values('pk')[:limit]
+    if params is None:
+        return queryset.count()
+    return cache.get_or_set(
+        f'{make_key(namespace, params)}:count',
+        queryset.count,
+        getattr(settings, 'CATALOG_CACHE_TIMEOUT', 86400),
+    )
+
+
+class PartialPks:
+    """
+    Sequence of a queryset's pks, of which only the first ones are cached.
+    Slices past the cached pks are queried
+    """
+    def __init__(self, pks, count, queryset):
+        self.pks = pks
+        self.count = count
+        self.queryset = queryset
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index.stop <= len(self.pks):
+            return self.pks[index]
+        return list(self.queryset.values_list('pk', flat=True)[index])
+
+
+class CachedResultsMixin:
+    """
+    Mixin for list views which paginates the cached pks of the view's
+    queryset rather than the queryset itself. Only the instances on the
+    current page are then fetched, with a single query
+    Subclasses must set `cache_namespace` and implement `get_cache_params`.
+    For potentially large results, `max_cached_results` limits the number of
+    pks cached and `max_count` the number of results counted
+    """
+    cache_namespace = None
+    max_cached_results = None
+    max_count = None
+
+    def get_cache_params(self):
+        """
+        Returns a dictionary of the parameters determining the queryset's
+        results, or None if the results shouldn't be cached
+        """
+        raise NotImplementedError
+
+    def get_count(self, queryset, params):
+        """
+        Returns the number of results, up to `max_count` plus one, so that
+        exceeding the limit can be told apart from reaching it. Taken from the
+        cached pks if these are complete, else counted and cached separately
+        """
+        limit = None if self.max_count is None else self.max_count + 1
+        if params is not None and self.max_cached_results is None:
+            pks = cache.get(make_key(self.cache_namespace, params))
+            if pks is not None:
+                return min(len(pks), limit or len(pks))
+        return get_cached_count(self.cache_namespace, params, queryset, limit)
+
+    def paginate_queryset(self, queryset, page_size):
+        params = self.get_cache_params()
+        if params is None:
+            return super().paginate_queryset(queryset, page_size)
+        pks = get_cached_pks(
+            self.cache_namespace, params, queryset, self.max_cached_results
+        )
+        if len(pks) == self.max_cached_results:
+            pks = PartialPks(pks, self.get_count(queryset, params), queryset)
+        paginator, page, pks, is_paginated = super().paginate_queryset(
+            pks, page_size
+        )
+        objects = queryset.in_bulk(pks)
+        # Preserve the cached ordering
+        page.object_list = [objects[pk] for pk in pks if pk in objects]
+        return paginator, page, page.object_list, is_paginated
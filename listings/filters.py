@@ -1,14 +1,30 @@
+from django.db.models import Exists, OuterRef
 from django_filters import FilterSet
 from django_filters.filters import CharFilter, NumberFilter, OrderingFilter
-from .models import Listing
+from .models import Listing, Material
 
 
 class ListingFilter(FilterSet):
     category = CharFilter(lookup_expr='iexact', field_name='category__name')
     price__lte = NumberFilter(lookup_expr='lte', field_name='price')
-    materials = CharFilter(lookup_expr='icontains')
+    materials = CharFilter(method='filter_materials')
     order_by = OrderingFilter(fields=(('price', 'price'),))
 
     class Meta:
         model = Listing
         fields = ['category', 'price', 'materials']
+
+    def filter_materials(self, queryset, name, value):
+        """
+        Filters Listing instances with all of the comma separated materials.
+        Names are resolved to pks beforehand, and each material is checked
+        with an EXISTS subquery on the through table, rather than joining it,
+        which would return duplicate instances
+        """
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        through = Listing.materials.through
+        for ids in Material.objects.resolve_ids(names):
+            queryset = queryset.filter(Exists(through.objects.filter(
+                listing_id=OuterRef('pk'), material_id__in=ids
+            )))
+        return queryset
@@ -0,0 +1,111 @@
+import re
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from listings.models import Category, Listing
+
+
+class Command(BaseCommand):
+    """
+    Compares the query plans of the storefront's catalog queries with and
+    without the partial indexes on unsold Listing instances. A synthetic
+    catalog is inserted, the queries are explained with the indexes, which
+    are then dropped and the queries explained again. Everything is done in a
+    transaction which is rolled back, so the db is left unchanged
+    """
+    help = 'Benchmarks catalog queries with and without the unsold indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--listings',
+            type=int,
+            default=100000,
+            help='Number of synthetic Listing instances to insert',
+        )
+        parser.add_argument(
+            '--categories',
+            type=int,
+            default=10,
+            help='Number of synthetic categories to insert',
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        with transaction.atomic():
+            category = self.populate(
+                options['listings'], options['categories']
+            )
+            queries = self.get_queries(category)
+            indexed = self.explain(queries)
+            with connection.cursor() as cursor:
+                for index in Listing._meta.indexes:
+                    if index.condition is not None:
+                        cursor.execute(f'DROP INDEX {index.name}')
+            unindexed = self.explain(queries)
+            transaction.set_rollback(True)
+
+        for name in queries:
+            (scan, time), (indexed_scan, indexed_time) = (
+                unindexed[name], indexed[name]
+            )
+            self.stdout.write(
+                f'{name}: {scan} ({time} ms) -> '
+                f'{indexed_scan} ({indexed_time} ms)'
+            )
+
+    def populate(self, listings, categories):
+        """
+        Inserts the synthetic catalog, roughly a tenth of which is sold, and
+        returns one of the categories
+        """
+        Category.objects.bulk_create([
+            Category(name=f'Benchmark {i}') for i in range(categories)
+        ])
+        ids = list(Category.objects.filter(
+            name__startswith='Benchmark '
+        ).values_list('id', flat=True))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                '''
+                INSERT INTO listings_listing (
+                    name, description, picture, category_id, pieces,
+                    price_currency, price, created, sold, slug, related,
+                    picture_widths
+                )
+                SELECT
+                    'Benchmark ' || i, '', 'benchmark.jpg',
+                    (%s::integer[])[1 + i %% %s], 1, 'USD',
+                    round((random() * 1000)::numeric, 2),
+                    current_date - i %% 1000, i %% 10 = 0,
+                    'benchmark-' || i, '{}', '{}'
+                FROM generate_series(1, %s) AS i
+                ''',
+                [ids, len(ids), listings]
+            )
+            cursor.execute('ANALYZE listings_listing')
+        self.stdout.write(f'Inserted {listings} listings')
+        return ids[0]
+
+    def get_queries(self, category):
+        listings = Listing.objects.unsold()
+        return {
+            'gallery': listings.order_by('-price', '-id')[:6],
+            'category': listings.filter(
+                category_id=category
+            ).order_by('-price')[:6],
+            'index': listings.filter(category_id=category)[:1],
+            'newest': listings.order_by('-created')[:6],
+        }
+
+    def explain(self, queries):
+        """
+        Returns the topmost scan and the execution time of each query's plan
+        """
+        plans = {}
+        for name, queryset in queries.items():
+            plan = queryset.explain(analyze=True)
+            if self.verbosity > 1:
+                self.stdout.write(plan)
+            scan = next(line for line in plan.splitlines() if 'Scan' in line)
+            time = re.search(r'Execution Time: ([\d.]+)', plan)
+            plans[name] = scan.split('(cost')[0].strip(' ->'), time.group(1)
+        return plans
@@ -0,0 +1,67 @@
+import time
+from django.core.management.base import BaseCommand
+from listings.models import Listing
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the search vectors of all Listing instances, or of those in
+    the given categories or with the given pks, in chunks. The vectors are
+    normally maintained by db triggers; this is intended for data imported
+    with triggers disabled, or after changing how vectors are computed
+    """
+    help = 'Recomputes the search vectors of Listing instances'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'pks',
+            nargs='*',
+            type=int,
+            help='Only reindex the Listing instances with these pks',
+        )
+        parser.add_argument(
+            '--category',
+            action='append',
+            default=[],
+            help='Only reindex Listing instances in this category',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of Listing instances to update at once',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        listings = Listing.objects.all()
+        if options['pks']:
+            listings = listings.filter(pk__in=options['pks'])
+        if options['category']:
+            listings = listings.filter(
+                category__name__in=options['category']
+            )
+        start = time.monotonic()
+        updated = 0
+        last_pk = 0
+
+        while True:
+            pks = list(
+                listings.filter(pk__gt=last_pk).order_by('pk').values_list(
+                    'pk', flat=True
+                )[:batch_size]
+            )
+            if not pks:
+                break
+            last_pk = pks[-1]
+            updated += Listing.objects.update_search_vectors(pks)
+            if options['verbosity'] > 0:
+                elapsed = time.monotonic() - start
+                self.stdout.write(
+                    f'Reindexed {updated} listings '
+                    f'({updated / elapsed:.0f} listings/s)'
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully reindexed {updated} listings'
+        ))
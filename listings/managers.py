@@ -1,17 +1,25 @@
-from django.db import models
-from django.db.models.functions import Concat
-from django.db.models import Value as V, TextField
-from django.contrib.postgres.search import SearchVector
-from django.contrib.postgres.aggregates import StringAgg
+import secrets
+from itertools import count
+import numpy as np
+from django.db import models, connection
+from django.db.models import Exists, OuterRef
+from django.utils.text import slugify
+from .similarity import rank_similar
+from .cache import bump_catalog_version, get_or_set
 
 
 class CategoryQuerySet(models.QuerySet):
     def in_stock(self):
         """
         Returns all Category instances with at least one unsold related
-        Listing object
+        Listing object. Uses an EXISTS subquery, served by the unsold
+        (category_id, price) index, rather than joining and deduplicating
+        every unsold Listing
         """
-        return self.filter(listing__sold=False).distinct()
+        Listing = self.model._meta.get_field('listing').related_model
+        return self.filter(Exists(Listing.objects.unsold().filter(
+            category_id=OuterRef('pk')
+        )))
 
 
 class CategoryManager(models.Manager):
@@ -21,58 +29,162 @@ class CategoryManager(models.Manager):
     def in_stock(self):
         return self.get_queryset().in_stock()
 
+    def get_in_stock(self):
+        """
+        Returns a list of the in stock Category instances, cached until the
+        catalog changes, e.g. a Listing is sold or a Category renamed
+        """
+        return get_or_set(
+            'categories_in_stock', lambda: list(self.in_stock().order_by('pk'))
+        )
+
     def get_example_listings(self):
         """
-        Yields one example Listing instance for each category
-        with at least one unsold related Listing. For use in
-        the index view
+        Returns one example Listing instance, the most expensive unsold one,
+        for each category with at least one unsold related Listing, with
+        their categories. Fetched with a single DISTINCT ON query rather than
+        one query per category. For use in the index view
+        """
+        Listing = self.model._meta.get_field('listing').related_model
+        return Listing.objects.unsold().select_related('category').defer(
+            'search_vector'
+        ).order_by('category_id', '-price', '-id').distinct('category_id')
+
+
+class MaterialManager(models.Manager):
+    def resolve_ids(self, names):
+        """
+        Returns a list of Material pks for each of the names: the pk of the
+        instance with that name, ignoring case, or else the pks of those
+        containing it. Exact names are resolved from a cached mapping of all
+        names, substrings are matched using the trigram index on `name`
         """
-        for category in self.in_stock().distinct():
-            yield category.listing_set.unsold().first()
+        ids = get_or_set('material_ids', lambda: {
+            name.lower(): pk for pk, name in self.values_list('pk', 'name')
+        })
+        resolved = []
+        for name in names:
+            if name.lower() in ids:
+                resolved.append([ids[name.lower()]])
+            else:
+                resolved.append(list(
+                    self.filter(name__icontains=name).values_list(
+                        'pk', flat=True
+                    )
+                ))
+        return resolved
 
 
 class ListingQuerySet(models.QuerySet):
     def unsold(self):
         return self.filter(sold=False)
 
+    def for_display(self):
+        """
+        Fetches the category and materials rendered along with each Listing
+        instance, e.g. by the `materials` and `add_or_view` tags, so that the
+        number of queries doesn't grow with the number of instances
+        """
+        return self.select_related('category').prefetch_related(
+            'materials'
+        ).defer('search_vector')
+
+    def reserve(self):
+        """
+        Atomically marks the unsold Listing instances in the queryset as sold,
+        using a single conditional UPDATE rather than reading and saving each
+        instance. Returns the number of instances reserved; concurrent
+        requests for the same instance can only reserve it once
+        """
+        reserved = self.unsold().update(sold=True)
+        if reserved:
+            bump_catalog_version()
+        return reserved
+
 
 class ListingManager(models.Manager.from_queryset(ListingQuerySet)):
-    def generate_summary(self):
-        """
-        Creates a field for aggregating all text fields into a single
-        searchable value. Postgres' SearchVector cannot include joined
-        fields since it uses Django's F expression, so this step is
-        necessary to search Listing through the Category and Material `name`
-        attributes in the Listing SearchVectorField.
-        Since this is a rather computationally intensive task, it shouldn't
-        be called in the ListingManager `get_queryset` method directly,
-        otherwise it will affect all Listing db calls
-        """
-        return self.get_queryset().annotate(
-            summary=Concat(
-                'name', V(' '),
-                'description', V(' '),
-                'category__name', V(' '),
-                StringAgg('materials__name', delimiter=' '),
-                output_field=TextField()
-            )
+    def unsold(self):
+        return self.get_queryset().unsold()
+
+    def generate_slug(self, name):
+        """
+        Returns a unique slug for the given name, appending the lowest free
+        numeric suffix if the slug is already taken. All existing slugs with
+        the same prefix are retrieved in a single query, rather than checking
+        each candidate against the db
+        """
+        max_length = self.model._meta.get_field('slug').max_length
+        # Names without any slug characters, e.g. punctuation only, are given
+        # a random token, rather than matching every slug
+        slug = slugify(name)[:max_length] or secrets.token_urlsafe(4)
+        taken = set(
+            self.filter(slug__startswith=slug).values_list('slug', flat=True)
         )
+        if slug not in taken:
+            return slug
+        for n in count(2):
+            suffix = f'-{n}'
+            candidate = f'{slug[:max_length - len(suffix)]}{suffix}'
+            if candidate not in taken:
+                return candidate
+
+    def update_search_vectors(self, ids):
+        """
+        Recomputes the search vectors of the Listing instances with the given
+        pks using a single set-based UPDATE, via the db function also used by
+        the category and material triggers. Returns the number of instances
+        updated
+        """
+        if not ids:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT listings_update_search_vectors(%s)', [list(ids)]
+            )
+            updated = cursor.fetchone()[0]
+        bump_catalog_version()
+        return updated
 
-    def query_summary(self):
+    def update_related(self, limit=20, batch_size=500):
         """
-        Adds the annotated `summary` value to the queryset. For
-        use in the Listing `save` method for post-save search
-        vector update
+        Computes the most similar unsold Listing instances for each unsold
+        instance and stores their pks in the `related` field, so that the
+        detail view can retrieve them with a single pk lookup. More than the
+        number displayed are stored, since some may be sold in the meantime
         """
-        vector = (
-            SearchVector('name', weight='A') +
-            SearchVector('description', weight='C') +
-            SearchVector('category__name', weight='B') +
-            SearchVector(StringAgg(
-                'materials__name', delimiter=' '
-            ), weight='A')
+        listings = list(
+            self.unsold().order_by('pk').values_list(
+                'pk', 'category_id', 'price'
+            )
         )
-        return self.generate_summary().annotate(summary=vector)
+        if not listings:
+            return
+        pks, categories, prices = zip(*listings)
+        index = {pk: i for i, pk in enumerate(pks)}
 
-    def unsold(self):
-        return self.get_queryset().unsold()
+        material_pairs = list(
+            self.model.materials.through.objects.filter(
+                listing_id__in=pks
+            ).values_list('listing_id', 'material_id')
+        )
+        material_index = {
+            material: i for i, material in enumerate(
+                {material for _, material in material_pairs}
+            )
+        }
+        materials = np.zeros((len(pks), len(material_index)))
+        for pk, material in material_pairs:
+            materials[index[pk], material_index[material]] = 1
+
+        ranked = rank_similar(
+            categories, materials, [float(price) for price in prices], limit
+        )
+        pks = np.array(pks)
+        self.bulk_update(
+            [
+                self.model(pk=pk, related=pks[related].tolist())
+                for pk, related in zip(pks.tolist(), ranked)
+            ],
+            ['related'],
+            batch_size=batch_size,
+        )
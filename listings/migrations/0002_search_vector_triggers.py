@@ -0,0 +1,172 @@
+from django.db import migrations
+
+
+# Computes the weighted search vector of a Listing instance from its id, name,
+# description and category id. Same weights as the vector previously
+# aggregated by `ListingManager.query_summary`: name and materials A, category
+# B, description C
+SEARCH_VECTOR_FUNCTION = '''
+CREATE OR REPLACE FUNCTION listings_search_vector(
+    integer, text, text, integer
+) RETURNS tsvector AS $$
+    SELECT
+        setweight(to_tsvector(coalesce($2, '')), 'A') ||
+        setweight(to_tsvector(coalesce($3, '')), 'C') ||
+        setweight(to_tsvector(coalesce(
+            (SELECT name FROM listings_category WHERE id = $4), ''
+        )), 'B') ||
+        setweight(to_tsvector(coalesce(
+            (
+                SELECT string_agg(material.name, ' ')
+                FROM listings_material AS material
+                JOIN listings_listing_materials AS listing_material
+                    ON listing_material.material_id = material.id
+                WHERE listing_material.listing_id = $1
+            ), ''
+        )), 'A')
+$$ LANGUAGE sql STABLE;
+'''
+
+LISTING_TRIGGER = '''
+CREATE OR REPLACE FUNCTION listings_listing_search_vector_trigger()
+RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := listings_search_vector(
+        NEW.id, NEW.name, NEW.description, NEW.category_id
+    );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER listings_listing_search_vector_insert
+    BEFORE INSERT ON listings_listing
+    FOR EACH ROW
+    EXECUTE PROCEDURE listings_listing_search_vector_trigger();
+
+CREATE TRIGGER listings_listing_search_vector_update
+    BEFORE UPDATE OF name, description, category_id ON listings_listing
+    FOR EACH ROW
+    WHEN (
+        OLD.name IS DISTINCT FROM NEW.name OR
+        OLD.description IS DISTINCT FROM NEW.description OR
+        OLD.category_id IS DISTINCT FROM NEW.category_id
+    )
+    EXECUTE PROCEDURE listings_listing_search_vector_trigger();
+'''
+
+CATEGORY_TRIGGER = '''
+CREATE OR REPLACE FUNCTION listings_category_search_vector_trigger()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE listings_listing
+    SET search_vector = listings_search_vector(
+        id, name, description, category_id
+    )
+    WHERE category_id = NEW.id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER listings_category_search_vector
+    AFTER UPDATE OF name ON listings_category
+    FOR EACH ROW
+    WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE PROCEDURE listings_category_search_vector_trigger();
+'''
+
+MATERIAL_TRIGGER = '''
+CREATE OR REPLACE FUNCTION listings_material_search_vector_trigger()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE listings_listing
+    SET search_vector = listings_search_vector(
+        id, name, description, category_id
+    )
+    WHERE id IN (
+        SELECT listing_id FROM listings_listing_materials
+        WHERE material_id = NEW.id
+    );
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER listings_material_search_vector
+    AFTER UPDATE OF name ON listings_material
+    FOR EACH ROW
+    WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE PROCEDURE listings_material_search_vector_trigger();
+'''
+
+LISTING_MATERIALS_TRIGGER = '''
+CREATE OR REPLACE FUNCTION listings_listing_materials_search_vector_trigger()
+RETURNS trigger AS $$
+DECLARE
+    changed_listing integer;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed_listing := OLD.listing_id;
+    ELSE
+        changed_listing := NEW.listing_id;
+    END IF;
+    UPDATE listings_listing
+    SET search_vector = listings_search_vector(
+        id, name, description, category_id
+    )
+    WHERE id = changed_listing;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER listings_listing_materials_search_vector
+    AFTER INSERT OR DELETE ON listings_listing_materials
+    FOR EACH ROW
+    EXECUTE PROCEDURE listings_listing_materials_search_vector_trigger();
+'''
+
+# Compute the vectors of existing instances
+BACKFILL = '''
+UPDATE listings_listing
+SET search_vector = listings_search_vector(id, name, description, category_id);
+'''
+
+DROP_TRIGGERS = '''
+DROP TRIGGER IF EXISTS listings_listing_materials_search_vector
+    ON listings_listing_materials;
+DROP TRIGGER IF EXISTS listings_material_search_vector ON listings_material;
+DROP TRIGGER IF EXISTS listings_category_search_vector ON listings_category;
+DROP TRIGGER IF EXISTS listings_listing_search_vector_update
+    ON listings_listing;
+DROP TRIGGER IF EXISTS listings_listing_search_vector_insert
+    ON listings_listing;
+DROP FUNCTION IF EXISTS listings_listing_materials_search_vector_trigger();
+DROP FUNCTION IF EXISTS listings_material_search_vector_trigger();
+DROP FUNCTION IF EXISTS listings_category_search_vector_trigger();
+DROP FUNCTION IF EXISTS listings_listing_search_vector_trigger();
+DROP FUNCTION IF EXISTS listings_search_vector(integer, text, text, integer);
+'''
+
+
+class Migration(migrations.Migration):
+    """
+    Maintains `Listing.search_vector` in the db with triggers on the listing,
+    category, material and listing materials tables, rather than updating it
+    from a Celery task after each save
+    """
+
+    dependencies = [
+        ('listings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                SEARCH_VECTOR_FUNCTION,
+                LISTING_TRIGGER,
+                CATEGORY_TRIGGER,
+                MATERIAL_TRIGGER,
+                LISTING_MATERIALS_TRIGGER,
+                BACKFILL,
+            ],
+            reverse_sql=DROP_TRIGGERS,
+        ),
+    ]
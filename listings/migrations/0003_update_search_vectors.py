@@ -0,0 +1,140 @@
+from django.db import migrations
+
+
+# Recomputes the search vectors of the given Listing instances with a single
+# UPDATE joined to an aggregate of their category and material names, rather
+# than computing each vector with separate subqueries
+UPDATE_FUNCTION = '''
+CREATE OR REPLACE FUNCTION listings_update_search_vectors(integer[])
+RETURNS integer AS $$
+DECLARE
+    updated integer;
+BEGIN
+    UPDATE listings_listing AS listing
+    SET search_vector =
+        setweight(to_tsvector(coalesce(listing.name, '')), 'A') ||
+        setweight(to_tsvector(coalesce(listing.description, '')), 'C') ||
+        setweight(to_tsvector(coalesce(summary.category, '')), 'B') ||
+        setweight(to_tsvector(coalesce(summary.materials, '')), 'A')
+    FROM (
+        SELECT
+            related.id,
+            category.name AS category,
+            string_agg(material.name, ' ') AS materials
+        FROM listings_listing AS related
+        JOIN listings_category AS category
+            ON category.id = related.category_id
+        LEFT JOIN listings_listing_materials AS listing_material
+            ON listing_material.listing_id = related.id
+        LEFT JOIN listings_material AS material
+            ON material.id = listing_material.material_id
+        WHERE related.id = ANY($1)
+        GROUP BY related.id, category.name
+    ) AS summary
+    WHERE listing.id = summary.id;
+    GET DIAGNOSTICS updated = ROW_COUNT;
+    RETURN updated;
+END
+$$ LANGUAGE plpgsql;
+'''
+
+# Related object triggers use the set-based update above
+TRIGGERS = '''
+CREATE OR REPLACE FUNCTION listings_category_search_vector_trigger()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM listings_update_search_vectors(ARRAY(
+        SELECT id FROM listings_listing WHERE category_id = NEW.id
+    ));
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION listings_material_search_vector_trigger()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM listings_update_search_vectors(ARRAY(
+        SELECT listing_id FROM listings_listing_materials
+        WHERE material_id = NEW.id
+    ));
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION listings_listing_materials_search_vector_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM listings_update_search_vectors(ARRAY[OLD.listing_id]);
+    ELSE
+        PERFORM listings_update_search_vectors(ARRAY[NEW.listing_id]);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+'''
+
+# Restores the trigger functions from `0002_search_vector_triggers`
+REVERSE_TRIGGERS = '''
+CREATE OR REPLACE FUNCTION listings_category_search_vector_trigger()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE listings_listing
+    SET search_vector = listings_search_vector(
+        id, name, description, category_id
+    )
+    WHERE category_id = NEW.id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION listings_material_search_vector_trigger()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE listings_listing
+    SET search_vector = listings_search_vector(
+        id, name, description, category_id
+    )
+    WHERE id IN (
+        SELECT listing_id FROM listings_listing_materials
+        WHERE material_id = NEW.id
+    );
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION listings_listing_materials_search_vector_trigger()
+RETURNS trigger AS $$
+DECLARE
+    changed_listing integer;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed_listing := OLD.listing_id;
+    ELSE
+        changed_listing := NEW.listing_id;
+    END IF;
+    UPDATE listings_listing
+    SET search_vector = listings_search_vector(
+        id, name, description, category_id
+    )
+    WHERE id = changed_listing;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP FUNCTION IF EXISTS listings_update_search_vectors(integer[]);
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0002_search_vector_triggers'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[UPDATE_FUNCTION, TRIGGERS],
+            reverse_sql=REVERSE_TRIGGERS,
+        ),
+    ]
@@ -0,0 +1,146 @@
+from django.db import migrations
+
+
+# Statement level triggers using transition tables, so that statements
+# affecting several rows, e.g. adding or removing several materials at once,
+# or renaming several categories or materials, recompute the vector of each
+# affected Listing instance once, rather than once per row
+TRIGGERS = '''
+DROP TRIGGER listings_listing_materials_search_vector
+    ON listings_listing_materials;
+DROP TRIGGER listings_material_search_vector ON listings_material;
+DROP TRIGGER listings_category_search_vector ON listings_category;
+
+CREATE OR REPLACE FUNCTION listings_listing_materials_search_vector_trigger()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM listings_update_search_vectors(ARRAY(
+        SELECT DISTINCT listing_id FROM changed
+    ));
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER listings_listing_materials_search_vector_insert
+    AFTER INSERT ON listings_listing_materials
+    REFERENCING NEW TABLE AS changed
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE listings_listing_materials_search_vector_trigger();
+
+CREATE TRIGGER listings_listing_materials_search_vector_delete
+    AFTER DELETE ON listings_listing_materials
+    REFERENCING OLD TABLE AS changed
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE listings_listing_materials_search_vector_trigger();
+
+CREATE OR REPLACE FUNCTION listings_category_search_vector_trigger()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM listings_update_search_vectors(ARRAY(
+        SELECT listing.id
+        FROM listings_listing AS listing
+        JOIN new_rows ON new_rows.id = listing.category_id
+        JOIN old_rows ON old_rows.id = new_rows.id
+        WHERE old_rows.name IS DISTINCT FROM new_rows.name
+    ));
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER listings_category_search_vector
+    AFTER UPDATE ON listings_category
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE listings_category_search_vector_trigger();
+
+CREATE OR REPLACE FUNCTION listings_material_search_vector_trigger()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM listings_update_search_vectors(ARRAY(
+        SELECT DISTINCT listing_material.listing_id
+        FROM listings_listing_materials AS listing_material
+        JOIN new_rows ON new_rows.id = listing_material.material_id
+        JOIN old_rows ON old_rows.id = new_rows.id
+        WHERE old_rows.name IS DISTINCT FROM new_rows.name
+    ));
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER listings_material_search_vector
+    AFTER UPDATE ON listings_material
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE listings_material_search_vector_trigger();
+'''
+
+# Restores the row level triggers from `0003_update_search_vectors`
+REVERSE_TRIGGERS = '''
+DROP TRIGGER listings_listing_materials_search_vector_insert
+    ON listings_listing_materials;
+DROP TRIGGER listings_listing_materials_search_vector_delete
+    ON listings_listing_materials;
+DROP TRIGGER listings_material_search_vector ON listings_material;
+DROP TRIGGER listings_category_search_vector ON listings_category;
+
+CREATE OR REPLACE FUNCTION listings_listing_materials_search_vector_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM listings_update_search_vectors(ARRAY[OLD.listing_id]);
+    ELSE
+        PERFORM listings_update_search_vectors(ARRAY[NEW.listing_id]);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER listings_listing_materials_search_vector
+    AFTER INSERT OR DELETE ON listings_listing_materials
+    FOR EACH ROW
+    EXECUTE PROCEDURE listings_listing_materials_search_vector_trigger();
+
+CREATE OR REPLACE FUNCTION listings_category_search_vector_trigger()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM listings_update_search_vectors(ARRAY(
+        SELECT id FROM listings_listing WHERE category_id = NEW.id
+    ));
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER listings_category_search_vector
+    AFTER UPDATE OF name ON listings_category
+    FOR EACH ROW
+    WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE PROCEDURE listings_category_search_vector_trigger();
+
+CREATE OR REPLACE FUNCTION listings_material_search_vector_trigger()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM listings_update_search_vectors(ARRAY(
+        SELECT listing_id FROM listings_listing_materials
+        WHERE material_id = NEW.id
+    ));
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER listings_material_search_vector
+    AFTER UPDATE OF name ON listings_material
+    FOR EACH ROW
+    WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE PROCEDURE listings_material_search_vector_trigger();
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0003_update_search_vectors'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=TRIGGERS, reverse_sql=REVERSE_TRIGGERS),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.7 on 2026-10-18 11:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0004_statement_search_vector_triggers'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='listing',
+            name='slug',
+            field=models.SlugField(editable=False, unique=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.0.7 on 2026-10-18 12:04
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_auto_20261018_1127'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='related',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, editable=False, size=None),
+        ),
+    ]
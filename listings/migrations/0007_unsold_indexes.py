@@ -0,0 +1,25 @@
+# Generated by Django 3.0.7 on 2026-10-18 14:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0006_listing_related'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(sold=False), fields=['price', 'id'], name='listing_unsold_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(sold=False), fields=['category', 'price'], name='listing_unsold_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(sold=False), fields=['created'], name='listing_unsold_created_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+# Indexes material names for substring matching. `icontains` lookups compare
+# the upper cased name, so the index is on the same expression
+MATERIAL_NAME_INDEX = '''
+CREATE INDEX material_name_trgm_idx
+    ON listings_material USING gin (UPPER(name) gin_trgm_ops);
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0007_unsold_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunSQL(
+            MATERIAL_NAME_INDEX,
+            reverse_sql='DROP INDEX material_name_trgm_idx;',
+        ),
+    ]
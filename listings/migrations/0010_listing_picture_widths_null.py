@@ -0,0 +1,26 @@
+# Generated by Django 3.0.7 on 2026-10-18 18:40
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0009_listing_picture_widths'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='listing',
+            name='picture_widths',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, editable=False, null=True, size=None),
+        ),
+        # Pictures without derivatives may not have been attempted yet
+        migrations.RunSQL(
+            "UPDATE listings_listing SET picture_widths = NULL "
+            "WHERE picture_widths = '{}'",
+            "UPDATE listings_listing SET picture_widths = '{}' "
+            "WHERE picture_widths IS NULL",
+        ),
+    ]
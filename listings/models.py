@@ -1,16 +1,17 @@
-import secrets
-from django.db import models, transaction
+from django.db import models, transaction, IntegrityError
 from django.urls import reverse
 from django.conf import settings
 from django.utils import timezone
-from django.utils.text import slugify
 from django.db.models import signals
 from django.dispatch import receiver
+from django.contrib.postgres.fields import ArrayField
 from django.contrib.postgres.indexes import GinIndex
 from django.contrib.postgres.search import SearchVectorField
 from djmoney.models.fields import MoneyField
 from ckeditor.fields import RichTextField
-from .managers import CategoryManager, ListingManager
+from common import images
+from .managers import CategoryManager, ListingManager, MaterialManager
+from .cache import bump_catalog_version
 
 
 class Category(models.Model):
@@ -32,6 +33,8 @@ class Category(models.Model):
 class Material(models.Model):
     name = models.CharField(max_length=100, unique=True)
 
+    objects = MaterialManager()
+
     def __repr__(self):
         return f"Model('{self.name}')"
 
@@ -47,22 +50,52 @@ class Listing(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = RichTextField()
     picture = models.ImageField(upload_to=listing_upload_path)
+    # Widths of the generated derivatives of `picture`, see `common.images`.
+    # None until generation has been attempted, as small pictures have none
+    picture_widths = ArrayField(
+        models.IntegerField(), null=True, blank=True, editable=False
+    )
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     materials = models.ManyToManyField(Material, blank=True)
     pieces = models.IntegerField(default=1)
     price = MoneyField(max_digits=14, decimal_places=2, default_currency='USD')
     created = models.DateField(default=timezone.now)
     sold = models.BooleanField(default=False)
-    slug = models.SlugField(editable=False)
+    slug = models.SlugField(editable=False, unique=True)
     order = models.ForeignKey(
         'shop.Order', null=True, blank=True, on_delete=models.SET_NULL
     )
+    # Maintained by db triggers, see `0002_search_vector_triggers` migration
     search_vector = SearchVectorField(null=True, blank=True, editable=False)
+    # Pks of similar Listing instances, most similar first. Periodically
+    # updated by `ListingManager.update_related`
+    related = ArrayField(
+        models.IntegerField(), default=list, blank=True, editable=False
+    )
 
     objects = ListingManager()
 
     class Meta:
-        indexes = [GinIndex(fields=['search_vector'])]
+        indexes = [
+            GinIndex(fields=['search_vector']),
+            # Partial indexes for the storefront, which only lists unsold
+            # instances. `id` breaks ties for keyset pagination
+            models.Index(
+                fields=['price', 'id'],
+                name='listing_unsold_price_idx',
+                condition=models.Q(sold=False),
+            ),
+            models.Index(
+                fields=['category', 'price'],
+                name='listing_unsold_category_idx',
+                condition=models.Q(sold=False),
+            ),
+            models.Index(
+                fields=['created'],
+                name='listing_unsold_created_idx',
+                condition=models.Q(sold=False),
+            ),
+        ]
         ordering = ['-price']
 
     def get_absolute_url(self):
@@ -76,44 +109,43 @@ class Listing(models.Model):
 
     def save(self, *args, **kwargs):
         """
-        Overrides `save` in order to:
-        1. Generate a slug once, ensuring that name changes do not
-        affect existing slug, otherwise existing URLs might 404
-        2. Call a celery tasks to update the instance's `search_vector`
-        by aggregating newly saved data, updating the field, and then re-
-        saving the instance, making sure that `save` is not being called
-        specifically to update the search vector
+        Overrides `save` in order to generate a slug once, ensuring that name
+        changes do not affect existing slug, otherwise existing URLs might 404
+        The slug is allocated by the manager and backed by a unique index, so
+        if the same slug is taken concurrently, a new one is allocated
+        The `search_vector` is updated by db triggers whenever the instance or
+        its related categories and materials change, so no further work is
+        needed here
         """
-        if not self.id:
-            slug = slugify(self.name)
-            # Ensure that slug is unique
-            if self.__class__.objects.filter(slug=slug).exists():
-                while True:
-                    # Use random token to avoid exposing application internals
-                    # to clients (i.e., by using instance pk)
-                    token = secrets.token_urlsafe(4)
-                    slug += token
-                    if not self.__class__.objects.filter(slug=slug).exists():
-                        break
-            self.slug = slug
-        super().save(*args, **kwargs)
-        if 'search_vector' not in kwargs.get('update_fields', {}):
-            from .tasks import update_search
-            # 'on_commit' necessary to avoid race condition between
-            # Django and Celery when accessing model instance
-            # NOTE Remember that TransactionTestCase is needed for tests
-            transaction.on_commit(
-                lambda: update_search.delay(self.pk)
-            )
+        if self.id:
+            return super().save(*args, **kwargs)
+        while True:
+            self.slug = self.__class__.objects.generate_slug(self.name)
+            try:
+                # Savepoint, so that any outer transaction can continue
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # Only retry if the slug was the cause of the error
+                if not self.__class__.objects.filter(slug=self.slug).exists():
+                    raise
 
     def get_related(self, limit=10):
         """
-        Returns list of Listing objects with the same category
-        as the instance, for use in detail view sidebar
+        Returns list of similar unsold Listing objects, most similar first,
+        for use in detail view sidebar. Falls back to Listing objects with
+        the same category as the instance if similar objects haven't been
+        computed yet
         """
-        return Listing.objects.exclude(id=self.id).filter(
-            category=self.category
-        ).select_related('category').defer('search_vector').unsold()[:limit+1]
+        listings = Listing.objects.exclude(id=self.id).select_related(
+            'category'
+        ).defer('search_vector').unsold()
+        if not self.related:
+            return listings.filter(category=self.category)[:limit+1]
+        related = listings.in_bulk(self.related)
+        return [
+            related[pk] for pk in self.related if pk in related
+        ][:limit+1]
 
     def __repr__(self):
         return f"Listing('{self.name}', '{self.category}')"
@@ -124,25 +156,23 @@ class Listing(models.Model):
 
 @receiver(signals.post_delete, sender=Listing)
 def auto_delete_picture(sender, instance, **kwargs):
+    images.delete_derivatives(sender, instance)
     instance.picture.delete(save=False)
 
 
-# The following signals call the instance `save` method to update the search
-# vector when related objects are updated
+signals.pre_save.connect(images.reset_derivatives, sender=Listing)
+signals.post_save.connect(images.schedule_derivatives, sender=Listing)
 
-@receiver(signals.post_save, sender=Category)
-def category_updated(sender, instance, **kwargs):
-    for listing in instance.listing_set.query_summary():
-        listing.save()
 
+# The following signals invalidate cached catalog query results when
+# Listing instances or the related objects they are filtered by change
 
+@receiver(signals.post_save, sender=Listing)
+@receiver(signals.post_delete, sender=Listing)
+@receiver(signals.post_save, sender=Category)
+@receiver(signals.post_delete, sender=Category)
 @receiver(signals.post_save, sender=Material)
-def materials_updated(sender, instance, **kwargs):
-    for listing in instance.listing_set.query_summary():
-        listing.save()
-
-
+@receiver(signals.post_delete, sender=Material)
 @receiver(signals.m2m_changed, sender=Listing.materials.through)
-def update_materials_m2m(sender, instance, action, **kwargs):
-    if action in ['post_save', 'post_clear', 'post_add']:
-        instance.save()
+def catalog_updated(sender, **kwargs):
+    bump_catalog_version()
@@ -0,0 +1,126 @@
+from django.core import signing
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.http import Http404
+
+
+class KeysetPaginationMixin:
+    """
+    Mixin for list views which paginates past the first `shallow_pages` pages
+    with cursors rather than offsets, so that deep pages don't get any slower
+    to query. A cursor is an opaque, signed token holding the keyset values
+    of the last (or first, when paging backwards) instance of a page, e.g.
+    its price and pk, which are then used to filter the next page
+    Intended to be used along with CachedResultsMixin, subclasses must
+    implement `get_keyset`
+    """
+    cursor_kwarg = 'cursor'
+    shallow_pages = 5
+
+    def get_keyset(self):
+        """
+        Returns the fields which uniquely order the queryset, all in the same
+        direction, e.g. ('-price', '-id')
+        """
+        raise NotImplementedError
+
+    def paginate_queryset(self, queryset, page_size):
+        keyset = self.get_keyset()
+        queryset = queryset.order_by(*keyset)
+        token = self.request.GET.get(self.cursor_kwarg)
+        if not token:
+            paginator, page, object_list, is_paginated = (
+                super().paginate_queryset(queryset, page_size)
+            )
+        else:
+            try:
+                cursor = signing.loads(token)
+            except signing.BadSignature:
+                raise Http404('Invalid cursor')
+            if cursor['keyset'] != list(keyset):
+                raise Http404('Invalid cursor')
+            paginator = Paginator(queryset, page_size)
+            paginator.count = self.get_count(
+                queryset, self.get_cache_params()
+            )
+            object_list = self.get_keyset_page(
+                queryset, keyset, cursor['values'], cursor['backwards'],
+                page_size
+            )
+            page = Page(object_list, cursor['number'], paginator)
+            is_paginated = True
+        self.set_cursors(page, keyset)
+        self.set_page_links(page)
+        return paginator, page, page.object_list, is_paginated
+
+    def get_keyset_page(self, queryset, keyset, values, backwards, size):
+        """
+        Returns the instances following the given keyset values, or preceding
+        them if paging backwards
+        """
+        condition = Q()
+        for i, field in enumerate(keyset):
+            descending = field.startswith('-') != backwards
+            lookup = f"{field.lstrip('-')}__{'lt' if descending else 'gt'}"
+            equal = {f.lstrip('-'): v for f, v in zip(keyset[:i], values)}
+            condition |= Q(**equal, **{lookup: values[i]})
+        if backwards:
+            keyset = [
+                f[1:] if f.startswith('-') else f'-{f}' for f in keyset
+            ]
+        object_list = [*queryset.filter(condition).order_by(*keyset)[:size]]
+        if backwards:
+            object_list.reverse()
+        return object_list
+
+    def get_cursor(self, obj, keyset, number, backwards=False):
+        values = []
+        for field in keyset:
+            value = getattr(obj, field.lstrip('-'))
+            # Money instances are compared by amount
+            value = getattr(value, 'amount', value)
+            if not isinstance(value, (int, float)):
+                value = str(value)
+            values.append(value)
+        return signing.dumps({
+            'keyset': list(keyset),
+            'values': values,
+            'number': number,
+            'backwards': backwards
+        })
+
+    def set_cursors(self, page, keyset):
+        """
+        Adds cursors to the page for its adjacent pages, when these are past
+        the shallow pages
+        """
+        page.next_cursor = page.previous_cursor = ''
+        object_list = [*page.object_list]
+        if not object_list:
+            return
+        if page.has_next() and page.number >= self.shallow_pages:
+            page.next_cursor = self.get_cursor(
+                object_list[-1], keyset, page.number + 1
+            )
+        if page.has_previous() and page.number > self.shallow_pages + 1:
+            page.previous_cursor = self.get_cursor(
+                object_list[0], keyset, page.number - 1, backwards=True
+            )
+
+    def set_page_links(self, page):
+        """
+        Adds the numbers of the pages within two of the page to link to, which
+        are limited to the shallow pages, as pages past these are only reached
+        with cursors. A deep page follows the shallow ones, separated by None
+        if there are pages in between
+        """
+        page.shallow_pages = self.shallow_pages
+        last = min(page.paginator.num_pages, self.shallow_pages)
+        page.page_links = [
+            n for n in range(page.number - 2, page.number + 3)
+            if 1 <= n <= last
+        ]
+        if page.number > self.shallow_pages:
+            if page.number > self.shallow_pages + 1:
+                page.page_links.append(None)
+            page.page_links.append(page.number)
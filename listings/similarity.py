@@ -0,0 +1,48 @@
+import numpy as np
+
+
+def rank_similar(categories, materials, prices, limit, chunk_size=256):
+    """
+    Ranks items by similarity to each other, based on their category,
+    materials and price. Takes an array of category ids, a 2D array with a
+    row of material indicators for each item, and an array of prices
+    Returns a 2D array with, for each item, the indices of the `limit` most
+    similar other items, most similar first
+
+    The similarity of two items is the sum of:
+    - 1 if they share the same category
+    - the cosine similarity of their materials
+    - 1 / (1 + the absolute difference of their log prices)
+    Scores are computed for `chunk_size` items at a time to bound memory use
+    """
+    n = len(categories)
+    limit = min(limit, n - 1)
+    if limit < 1:
+        return np.empty((n, 0), dtype=int)
+
+    categories = np.asarray(categories)
+    materials = np.asarray(materials, dtype=np.float32)
+    norms = np.linalg.norm(materials, axis=1, keepdims=True)
+    materials = np.divide(
+        materials, norms, out=np.zeros_like(materials), where=norms > 0
+    )
+    log_prices = np.log1p(np.asarray(prices, dtype=np.float32))
+
+    ranked = np.empty((n, limit), dtype=int)
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        rows = np.arange(start, stop)
+        scores = (
+            (categories[rows, None] == categories[None, :])
+            + materials[rows] @ materials.T
+            + 1 / (1 + np.abs(log_prices[rows, None] - log_prices[None, :]))
+        )
+        # Items shouldn't be related to themselves
+        scores[rows - start, rows] = -np.inf
+        # Select the top scores without sorting every row, then sort those
+        top = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+        order = np.argsort(
+            -np.take_along_axis(scores, top, axis=1), axis=1, kind='stable'
+        )
+        ranked[start:stop] = np.take_along_axis(top, order, axis=1)
+    return ranked
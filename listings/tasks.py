@@ -1,14 +1,12 @@
-from celery.decorators import task
+from celery.decorators import periodic_task
+from celery.schedules import crontab
 from .models import Listing
 
 
-@task(name='update_search')
-def update_search(pk):
+@periodic_task(run_every=crontab(minute=30))
+def update_related():
     """
-    Updates a Listing instance's search vector field following
-    db saves. Not strictly necessary at this stage to offload it
-    to a Celery task, but will scale better as db rows increase
+    Recomputes the similar Listing instances displayed in the detail view
+    sidebar, once an hour
     """
-    instance = Listing.objects.query_summary().get(pk=pk)
-    instance.search_vector = instance.summary
-    instance.save(update_fields=['search_vector'])
+    Listing.objects.update_related()
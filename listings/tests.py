@@ -1,3 +1,369 @@
+from io import StringIO
+from unittest.mock import patch
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.core import management
+from django.db.models import Value as V
+from django.db.models.functions import Concat
+from .models import Category, Listing, Material
+from .cache import get_cached_count, get_catalog_version
+from .views import ListingFilterView
 
-# Create your tests here.
+
+class ListingTestCase(TestCase):
+    """
+    Load the test fixtures from the listings app
+    """
+    fixtures = ['listings/fixtures/listings.yaml']
+
+
+class SearchVectorTestCase(ListingTestCase):
+    """
+    Test that the search vector is maintained by the db triggers
+    """
+    def setUp(self):
+        self.listing = Listing.objects.get(pk=1)
+
+    def assertSearchable(self, query):
+        self.assertIn(
+            self.listing, Listing.objects.filter(search_vector=query)
+        )
+
+    def test_listing_updated(self):
+        self.listing.name = 'Brooch'
+        self.listing.save()
+        self.assertSearchable('brooch')
+
+    def test_listing_created(self):
+        listing = Listing.objects.create(
+            name='Ring',
+            description='This is a ring',
+            category=self.listing.category,
+            price=100,
+        )
+        self.assertIn(listing, Listing.objects.filter(search_vector='ring'))
+
+    def test_category_updated(self):
+        category = self.listing.category
+        category.name = 'Charms'
+        category.save()
+        self.assertSearchable('charms')
+
+    def test_materials_updated(self):
+        material = Material.objects.create(name='Turquoise')
+        self.listing.materials.add(material)
+        self.assertSearchable('turquoise')
+        material.name = 'Garnet'
+        material.save()
+        self.assertSearchable('garnet')
+        self.listing.materials.remove(material)
+        self.assertNotIn(
+            self.listing, Listing.objects.filter(search_vector='garnet')
+        )
+
+    def test_bulk_updated(self):
+        """
+        Statements affecting several rows should update every related vector
+        """
+        materials = [
+            Material.objects.create(name=name)
+            for name in ('Turquoise', 'Garnet', 'Onyx')
+        ]
+        self.listing.materials.add(*materials)
+        self.assertSearchable('onyx')
+        Material.objects.filter(
+            id__in=[material.pk for material in materials]
+        ).update(name=Concat(V('Polished '), 'name'))
+        self.assertSearchable('polished')
+        self.listing.materials.set([])
+        self.assertNotIn(
+            self.listing, Listing.objects.filter(search_vector='polished')
+        )
+
+    def test_category_created(self):
+        """
+        Unrelated categories shouldn't affect existing vectors
+        """
+        vector = self.listing.search_vector
+        Category.objects.create(name='Rings')
+        self.listing.refresh_from_db()
+        self.assertEqual(vector, self.listing.search_vector)
+
+
+class SlugTestCase(ListingTestCase):
+    def create(self, name):
+        return Listing.objects.create(
+            name=name,
+            description=name,
+            category=Category.objects.first(),
+            price=100,
+        )
+
+    def test_unique_slug(self):
+        """
+        Colliding slugs should be given the lowest free numeric suffix
+        """
+        self.assertEqual('silver-ring', self.create('Silver Ring').slug)
+        self.assertEqual('silver-ring-2', self.create('Silver ring').slug)
+        self.assertEqual('silver-ring-3', self.create('silver ring').slug)
+
+    def test_empty_slug(self):
+        """
+        Names without slug characters should still be given a slug
+        """
+        slug = self.create('!!!').slug
+        self.assertTrue(slug)
+        self.assertNotEqual(slug, self.create('???').slug)
+
+    def test_generate_slug_single_query(self):
+        with self.assertNumQueries(1):
+            slug = Listing.objects.generate_slug('Pendant')
+        self.assertEqual('pendant-2', slug)
+
+    def test_slug_unchanged(self):
+        listing = Listing.objects.get(slug='pendant')
+        listing.name = 'Silver Pendant'
+        listing.save()
+        self.assertEqual('pendant', listing.slug)
+
+
+class ReindexSearchTestCase(ListingTestCase):
+    def test_reindex(self):
+        Listing.objects.update(search_vector=None)
+        management.call_command(
+            'reindexsearch', batch_size=1, stdout=StringIO()
+        )
+        self.assertFalse(Listing.objects.filter(search_vector=None).exists())
+        self.assertIn(
+            Listing.objects.get(pk=1),
+            Listing.objects.filter(search_vector='amethyst')
+        )
+
+    def test_reindex_category(self):
+        Listing.objects.update(search_vector=None)
+        management.call_command(
+            'reindexsearch', category=['Pendants'], stdout=StringIO()
+        )
+        self.assertEqual(
+            {*Listing.objects.exclude(search_vector=None)},
+            {*Listing.objects.filter(category__name='Pendants')}
+        )
+
+
+class BenchmarkCatalogTestCase(ListingTestCase):
+    def test_benchmark(self):
+        out = StringIO()
+        management.call_command(
+            'benchmarkcatalog', listings=100, categories=2, stdout=out
+        )
+        self.assertIn('gallery:', out.getvalue())
+        # The synthetic catalog is rolled back
+        self.assertEqual(4, Listing.objects.count())
+        self.assertFalse(
+            Category.objects.filter(name__startswith='Benchmark').exists()
+        )
+
+
+class RelatedTestCase(ListingTestCase):
+    def setUp(self):
+        Listing.objects.update_related()
+        self.listing = Listing.objects.get(pk=3)
+
+    def test_update_related(self):
+        """
+        Listings with the same materials should be the most similar
+        """
+        self.assertEqual(2, self.listing.related[0])
+        self.assertNotIn(self.listing.pk, self.listing.related)
+        with self.assertNumQueries(1):
+            related = self.listing.get_related()
+        self.assertEqual(Listing.objects.get(pk=2), related[0])
+
+    def test_related_sold(self):
+        Listing.objects.filter(pk=2).reserve()
+        self.assertNotIn(
+            Listing.objects.get(pk=2), self.listing.get_related()
+        )
+
+
+class CatalogCacheTestCase(ListingTestCase):
+    def get_gallery(self, **params):
+        return self.client.get(reverse('listing:filter'), params)
+
+    def test_cached_results(self):
+        response = self.get_gallery(order_by='price')
+        self.assertEqual(
+            Listing.objects.get(pk=3), response.context['object_list'][-1]
+        )
+        # Plain updates don't invalidate the cache, so the cached ordering
+        # should be used for equivalent queries
+        Listing.objects.filter(pk=3).update(price=1)
+        response = self.get_gallery(order_by='price', category='')
+        self.assertEqual(
+            Listing.objects.get(pk=3), response.context['object_list'][-1]
+        )
+
+    def test_reserve_invalidates(self):
+        version = get_catalog_version()
+        self.get_gallery()
+        Listing.objects.filter(pk=1).reserve()
+        self.assertNotEqual(version, get_catalog_version())
+        response = self.get_gallery()
+        self.assertNotIn(
+            Listing.objects.get(pk=1), response.context['object_list']
+        )
+
+    def test_save_invalidates(self):
+        version = get_catalog_version()
+        Category.objects.filter(pk=2).get().save()
+        self.assertNotEqual(version, get_catalog_version())
+
+    def test_bounded_count_unordered(self):
+        """
+        Bounded counts shouldn't sort the results they count
+        """
+        listings = Listing.objects.order_by('-price')
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(2, get_cached_count('test', None, listings, 2))
+        self.assertNotIn('ORDER BY', context.captured_queries[0]['sql'])
+
+
+@patch.multiple(ListingFilterView, paginate_by=1, shallow_pages=1)
+class KeysetPaginationTestCase(ListingTestCase):
+    def get_gallery(self, **params):
+        response = self.client.get(reverse('listing:filter'), params)
+        return response.context['page_obj']
+
+    def test_cursor_pages(self):
+        """
+        Following the cursors should visit every listing in order
+        """
+        page = self.get_gallery(order_by='price')
+        listings = [*page]
+        while page.next_cursor:
+            page = self.get_gallery(order_by='price', cursor=page.next_cursor)
+            listings.extend(page)
+        self.assertEqual([*Listing.objects.order_by('price', 'id')], listings)
+        self.assertEqual(4, page.number)
+        self.assertFalse(page.has_next())
+        # Paging backwards from the last page
+        previous = self.get_gallery(
+            order_by='price', cursor=page.previous_cursor
+        )
+        self.assertEqual(3, previous.number)
+        self.assertEqual(listings[2:3], [*previous])
+
+    def test_page_links(self):
+        """
+        Only the shallow pages should be linked to by number
+        """
+        page = self.get_gallery(order_by='price')
+        self.assertEqual([1], page.page_links)
+        page = self.get_gallery(order_by='price', cursor=page.next_cursor)
+        self.assertEqual([1, 2], page.page_links)
+        response = self.client.get(
+            reverse('listing:filter'),
+            {'order_by': 'price', 'cursor': page.next_cursor}
+        )
+        # Separated from the shallow pages by a gap
+        self.assertEqual([1, None, 3], response.context['page_obj'].page_links)
+        self.assertNotContains(response, '>Last</a>')
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            reverse('listing:filter'), {'cursor': 'invalid'}
+        )
+        self.assertEqual(404, response.status_code)
+
+
+class QueryCountTestCase(ListingTestCase):
+    def count_queries(self, url, **params):
+        # Counts are taken once any cached values have been populated
+        self.client.get(url, params)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url, params)
+        return len(context)
+
+    def test_gallery(self):
+        """
+        Rendering more listings shouldn't require more queries
+        """
+        url = reverse('listing:filter')
+        with patch.object(ListingFilterView, 'paginate_by', 1):
+            single = self.count_queries(url, category='Pendants')
+        self.assertEqual(single, self.count_queries(url, category=''))
+
+    def test_for_display(self):
+        listing = Listing.objects.for_display().get(pk=1)
+        with self.assertNumQueries(0):
+            listing.get_absolute_url()
+            [*listing.materials.all()]
+
+
+class MaterialFilterTestCase(ListingTestCase):
+    def get_gallery(self, materials):
+        response = self.client.get(
+            reverse('listing:filter'), {'materials': materials}
+        )
+        return {*response.context['object_list']}
+
+    def test_single_material(self):
+        # Shouldn't return duplicates of listings with several materials
+        response = self.client.get(
+            reverse('listing:filter'), {'materials': 'silver'}
+        )
+        self.assertEqual(4, len(response.context['object_list']))
+        self.assertEqual(
+            {Listing.objects.get(pk=1)}, self.get_gallery('Amethyst')
+        )
+
+    def test_several_materials(self):
+        self.assertEqual(
+            {*Listing.objects.filter(pk__in=[2, 3])},
+            self.get_gallery('silver, copper')
+        )
+
+    def test_substring(self):
+        self.assertEqual(
+            {Listing.objects.get(pk=1)}, self.get_gallery('meth')
+        )
+        self.assertEqual(set(), self.get_gallery('gold'))
+
+    def test_resolve_ids_cached(self):
+        Material.objects.resolve_ids(['silver'])
+        with self.assertNumQueries(0):
+            self.assertEqual([[3]], Material.objects.resolve_ids(['Silver']))
+
+
+class InStockTestCase(ListingTestCase):
+    def test_in_stock(self):
+        Listing.objects.filter(category__name='Pendants').reserve()
+        Category.objects.create(name='Rings')
+        self.assertEqual(
+            ['Jewelry', 'Earrings', 'Bracelets'],
+            [category.name for category in Category.objects.get_in_stock()]
+        )
+
+    def test_cached(self):
+        Category.objects.get_in_stock()
+        with self.assertNumQueries(0):
+            Category.objects.get_in_stock()
+        # Invalidated when a Listing is sold
+        Listing.objects.filter(pk=1).reserve()
+        self.assertNotIn(
+            Category.objects.get(name='Pendants'),
+            Category.objects.get_in_stock()
+        )
+
+    def test_lazy(self):
+        """
+        Templates which don't render the categories shouldn't fetch them
+        """
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('cart:status'))
+        self.assertFalse(any(
+            'listings_category' in query['sql']
+            for query in context.captured_queries
+        ))
@@ -3,12 +3,33 @@ from django.http import Http404
 from django_filters.views import FilterView
 from .models import Listing
 from .filters import ListingFilter
+from .cache import CachedResultsMixin
+from .pagination import KeysetPaginationMixin
 
 
-class ListingFilterView(FilterView):
+class ListingFilterView(KeysetPaginationMixin, CachedResultsMixin, FilterView):
     filterset_class = ListingFilter
-    queryset = Listing.objects.unsold().defer('search_vector')
+    queryset = Listing.objects.unsold().for_display()
     paginate_by = 6
+    cache_namespace = 'gallery'
+    # The catalog version changes with every cart, so only the pks of the
+    # shallow pages are cached, deeper pages being reached with cursors
+    max_cached_results = KeysetPaginationMixin.shallow_pages * paginate_by
+
+    def get_cache_params(self):
+        """
+        Results are cached by the cleaned filter values, so that equivalent
+        query strings share the same results
+        """
+        if not self.filterset.is_valid():
+            return None
+        return self.filterset.form.cleaned_data
+
+    def get_keyset(self):
+        order = self.request.GET.get('order_by')
+        if order not in ('price', '-price'):
+            order = '-price'
+        return (order, order.replace('price', 'id'))
 
     def get_context_data(self, *args, **kwargs):
         """
@@ -44,7 +65,7 @@ class ListingDetailView(DetailView):
         """
         obj = Listing.objects.filter(
             slug=self.kwargs['slug']
-        ).prefetch_related('category').defer('search_vector').first()
+        ).for_display().first()
 
         if obj.sold:
             raise Http404
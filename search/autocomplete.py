@@ -0,0 +1,111 @@
+import difflib
+import hashlib
+import math
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import islice
+from urllib.parse import urlencode
+from django.urls import reverse
+from listings.cache import get_catalog_version, get_or_set
+from listings.models import Category, Listing, Material
+
+
+def build_terms():
+    """
+    Returns a sorted list of the terms suggested by autocomplete, as tuples
+    of the lowercased term, the term, its type and the url it links to
+    """
+    listings = Listing.objects.unsold().select_related('category').only(
+        'name', 'slug', 'category', 'category__name'
+    )
+    terms = [
+        (listing.name, 'listing', listing.get_absolute_url())
+        for listing in listings
+    ]
+    gallery = reverse('listing:filter')
+    terms.extend(
+        (name, 'category', f"{gallery}?{urlencode({'category': name})}")
+        for name in Category.objects.in_stock().values_list('name', flat=True)
+    )
+    terms.extend(
+        (name, 'material', f"{gallery}?{urlencode({'materials': name})}")
+        for name in Material.objects.values_list('name', flat=True)
+    )
+    return sorted((term.lower(), term, *rest) for term, *rest in terms)
+
+
+# Index of the terms for the catalog version it was built for, kept in
+# process memory so that the terms aren't unpickled on every lookup
+_index = None
+
+# Minimum similarity of the terms suggested for misspelled prefixes
+CUTOFF = 0.7
+
+
+def get_index():
+    """
+    Returns the sorted terms suggested by autocomplete, along with the terms
+    by lowercased term, grouped by length, for the current catalog version.
+    The terms are cached until the catalog changes, and the index rebuilt
+    from them only when the version changes
+    """
+    global _index
+    version = get_catalog_version()
+    if _index is None or _index[0] != version:
+        terms = get_or_set('autocomplete_terms', build_terms)
+        lengths = defaultdict(dict)
+        for term in terms:
+            lengths[len(term[0])][term[0]] = term
+        _index = version, terms, lengths
+    return _index[1:]
+
+
+def get_close_terms(prefix, lengths, limit):
+    """
+    Returns up to `limit` terms close to the prefix. Only terms whose length
+    allows a similarity of at least `CUTOFF` are compared
+    """
+    size = len(prefix)
+    candidates = {}
+    # Rounded outwards, as difflib makes the exact comparison
+    for length in range(
+        math.floor(size * CUTOFF / (2 - CUTOFF)),
+        math.ceil(size * (2 - CUTOFF) / CUTOFF) + 1
+    ):
+        candidates.update(lengths.get(length, {}))
+    return [
+        candidates[close] for close in difflib.get_close_matches(
+            prefix, candidates, n=limit, cutoff=CUTOFF
+        )
+    ]
+
+
+def suggest(prefix, limit=8):
+    """
+    Returns up to `limit` terms starting with the prefix, found by bisecting
+    the sorted terms. If there aren't enough, terms close to the prefix are
+    added, so that misspelled terms, e.g. `amethist`, still match
+    """
+    terms, lengths = get_index()
+    matches = []
+    for term in islice(terms, bisect_left(terms, (prefix,)), None):
+        if not term[0].startswith(prefix) or len(matches) == limit:
+            break
+        matches.append(term)
+    if len(matches) < limit:
+        for term in get_close_terms(prefix, lengths, limit):
+            if term not in matches:
+                matches.append(term)
+    return [
+        {'name': name, 'type': type, 'url': url}
+        for _, name, type, url in matches[:limit]
+    ]
+
+
+def get_suggestions(prefix):
+    """
+    Returns the suggestions for a prefix, cached until the catalog changes
+    """
+    prefix = ' '.join(prefix.lower().split())
+    digest = hashlib.md5(prefix.encode()).hexdigest()
+    return get_or_set(f'autocomplete:{digest}', lambda: suggest(prefix))
@@ -1,5 +1,8 @@
+from common.utils import lazy_context
 from .forms import SearchForm
 
 
 def search_form(request):
-    return {'search_form': SearchForm()}
+    return {
+        'search_form': lazy_context(request, 'search_form', SearchForm)
+    }
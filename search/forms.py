@@ -9,6 +9,8 @@ class SearchForm(forms.Form):
                 'required': 'true',
                 'type': 'search',
                 'name': 'q',
-                'placeholder': 'Search...'
+                'placeholder': 'Search...',
+                'list': 'search-suggestions',
+                'autocomplete': 'off',
             }
         ))
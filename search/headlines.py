@@ -0,0 +1,85 @@
+import hashlib
+from html import escape, unescape
+import bleach
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils.safestring import mark_safe
+
+
+# Private use characters delimiting the highlighted words, replaced by mark
+# elements once the rest of the headline has been escaped
+START, STOP = '\ue000', '\ue001'
+
+HEADLINES = '''
+SELECT
+    page.id,
+    ts_headline(page.name, query, %s),
+    ts_headline(page.description, query, %s)
+FROM
+    unnest(%s::integer[], %s::text[], %s::text[])
+        AS page(id, name, description),
+    plainto_tsquery(%s) AS query
+'''
+
+NAME_OPTIONS = f'StartSel={START}, StopSel={STOP}, HighlightAll=true'
+DESCRIPTION_OPTIONS = (
+    f'StartSel={START}, StopSel={STOP}, MinWords=5, MaxWords=15'
+)
+
+
+def get_plain_descriptions(listings):
+    """
+    Returns the descriptions of the Listing instances as plain text, by pk.
+    The rich text descriptions are stripped of markup with bleach, and the
+    results cached by the descriptions' hashes, so they never go stale
+    """
+    keys = {}
+    for listing in listings:
+        digest = hashlib.md5(listing.description.encode()).hexdigest()
+        keys[f'description:{digest}'] = listing
+    descriptions = cache.get_many(keys)
+    missing = {
+        key: unescape(bleach.clean(listing.description, tags=[], strip=True))
+        for key, listing in keys.items() if key not in descriptions
+    }
+    cache.set_many(
+        missing, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 86400)
+    )
+    descriptions.update(missing)
+    return {listing.pk: descriptions[key] for key, listing in keys.items()}
+
+
+def highlight(headline):
+    return mark_safe(
+        escape(headline).replace(START, '<mark>').replace(STOP, '</mark>')
+    )
+
+
+def add_headlines(listings, q):
+    """
+    Sets `name_headline` and `description_headline` on each of the Listing
+    instances, highlighting the words matching the search query. Headlines
+    are generated with a single query, only for the given instances, e.g.
+    those on the current page
+    """
+    if not listings:
+        return
+    descriptions = get_plain_descriptions(listings)
+    with connection.cursor() as cursor:
+        cursor.execute(HEADLINES, [
+            NAME_OPTIONS,
+            DESCRIPTION_OPTIONS,
+            [listing.pk for listing in listings],
+            [listing.name for listing in listings],
+            [descriptions[listing.pk] for listing in listings],
+            q,
+        ])
+        headlines = {
+            pk: (name, description)
+            for pk, name, description in cursor.fetchall()
+        }
+    for listing in listings:
+        name, description = headlines[listing.pk]
+        listing.name_headline = highlight(name)
+        listing.description_headline = highlight(description)
@@ -4,3 +4,26 @@ let clicks = 0;
 searchIcon.addEventListener('click', () => {
   clicks === 0 ? clicks++ : searchForm.submit();
 });
+
+const searchInput = searchForm.querySelector('input');
+const suggestions = searchForm.querySelector('datalist');
+let timeout;
+searchInput.addEventListener('input', () => {
+  clearTimeout(timeout);
+  timeout = setTimeout(() => {
+    const q = searchInput.value.trim();
+    if (q.length < 2) {
+      return;
+    }
+    fetch(`${searchForm.dataset.autocomplete}?q=${encodeURIComponent(q)}`)
+      .then(response => response.json())
+      .then(data => {
+        suggestions.innerHTML = '';
+        data.results.forEach(result => {
+          const option = document.createElement('option');
+          option.value = result.name;
+          suggestions.appendChild(option);
+        });
+      });
+  }, 150);
+});
@@ -1,6 +1,8 @@
+from unittest.mock import patch
 from django.test import TestCase
 from django.urls import reverse
-from listings.models import Listing
+from listings.models import Listing, Material
+from .views import SearchListView
 
 
 class SearchTestCase(TestCase):
@@ -15,6 +17,11 @@ class SearchViewTest(SearchTestCase):
         response = self.client.get(reverse('search'))
         self.assertEqual(response.status_code, 200)
 
+    def test_empty_query(self):
+        response = self.client.get(reverse('search'), {'q': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(0, response.context['total'])
+
     def test_search_filter(self):
         # Broad search, should contain several fixture listings
         response = self.client.get(reverse('search'), {'q': 'silver'})
@@ -25,3 +32,106 @@ class SearchViewTest(SearchTestCase):
         results = response.context['object_list']
         self.assertEqual(len(results), 1)
         self.assertIn(Listing.objects.get(pk=2), results)
+
+
+class SearchPaginationTest(SearchTestCase):
+    @patch.multiple(SearchListView, paginate_by=1, shallow_pages=1)
+    def test_cursor_pages(self):
+        """
+        Following the cursors should visit every result once, in rank order
+        """
+        response = self.client.get(reverse('search'), {'q': 'silver'})
+        page = response.context['page_obj']
+        results = [*page]
+        while page.next_cursor:
+            response = self.client.get(
+                reverse('search'), {'q': 'silver', 'cursor': page.next_cursor}
+            )
+            page = response.context['page_obj']
+            results.extend(page)
+        self.assertEqual(4, response.context['total'])
+        self.assertEqual({*Listing.objects.all()}, {*results})
+        ranks = [listing.rank for listing in results]
+        self.assertEqual(sorted(ranks, reverse=True), ranks)
+
+
+class SearchCountTest(SearchTestCase):
+    @patch.multiple(SearchListView, paginate_by=1, max_cached_results=2)
+    def test_partial_pks(self):
+        """
+        Pages past the cached pks should still be paginated in rank order
+        """
+        ranks = []
+        for page in range(1, 5):
+            response = self.client.get(
+                reverse('search'), {'q': 'silver', 'page': page}
+            )
+            self.assertEqual(4, response.context['total'])
+            ranks.extend(
+                listing.rank for listing in response.context['object_list']
+            )
+        self.assertEqual(4, len(ranks))
+        self.assertEqual(sorted(ranks, reverse=True), ranks)
+
+    @patch.multiple(SearchListView, max_cached_results=1, max_count=2)
+    def test_bounded_count(self):
+        response = self.client.get(reverse('search'), {'q': 'silver'})
+        self.assertEqual(2, response.context['total'])
+        self.assertTrue(response.context['total_capped'])
+
+    @patch.multiple(SearchListView, max_cached_results=1, max_count=4)
+    def test_count_at_limit(self):
+        response = self.client.get(reverse('search'), {'q': 'silver'})
+        self.assertEqual(4, response.context['total'])
+        self.assertFalse(response.context['total_capped'])
+
+
+class AutocompleteTest(SearchTestCase):
+    def get_names(self, q):
+        response = self.client.get(reverse('autocomplete'), {'q': q})
+        return [result['name'] for result in response.json()['results']]
+
+    def test_prefix(self):
+        self.assertEqual(['Pendant', 'Pendants'], self.get_names('pend'))
+        self.assertEqual(['Silver'], self.get_names('SIL'))
+
+    def test_fuzzy(self):
+        self.assertIn('Amethyst', self.get_names('amethist'))
+
+    def test_short_prefix(self):
+        self.assertEqual([], self.get_names('p'))
+
+    def test_url_encoded(self):
+        Material.objects.create(name='Rose & Gold')
+        response = self.client.get(reverse('autocomplete'), {'q': 'rose'})
+        self.assertEqual(
+            f"{reverse('listing:filter')}?materials=Rose+%26+Gold",
+            response.json()['results'][0]['url']
+        )
+
+    def test_invalidated(self):
+        self.assertIn('Necklace', self.get_names('neck'))
+        Listing.objects.filter(pk=2).reserve()
+        self.assertNotIn('Necklace', self.get_names('neck'))
+
+
+class HeadlineTest(SearchTestCase):
+    def test_headlines(self):
+        response = self.client.get(reverse('search'), {'q': 'pendant'})
+        listing = response.context['object_list'][0]
+        self.assertEqual('<mark>Pendant</mark>', listing.name_headline)
+        self.assertIn('<mark>pendant</mark>', listing.description_headline)
+
+    def test_escaped(self):
+        """
+        Descriptions are stripped of markup, and the rest escaped
+        """
+        Listing.objects.filter(pk=1).update(
+            description='<p>A <b>pendant</b> &amp; <script>chain</script></p>'
+        )
+        response = self.client.get(reverse('search'), {'q': 'pendant'})
+        listing = response.context['object_list'][0]
+        self.assertNotIn('<b>', listing.description_headline)
+        self.assertNotIn('<script>', listing.description_headline)
+        self.assertIn('&amp;', listing.description_headline)
+        self.assertIn('<mark>pendant</mark>', listing.description_headline)
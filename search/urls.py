@@ -4,4 +4,5 @@ from . import views
 
 urlpatterns = [
     path('', views.SearchListView.as_view(), name='search'),
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
 ]
@@ -1,38 +1,80 @@
-from django.db.models import F
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast
+from django.http import JsonResponse
+from django.utils.cache import patch_cache_control
 from django.views.generic import ListView
 from django.contrib.postgres.search import SearchQuery, SearchRank
 from listings.models import Listing
+from listings.cache import CachedResultsMixin
+from listings.pagination import KeysetPaginationMixin
+from .autocomplete import get_suggestions
+from .headlines import add_headlines
 
 
-class SearchListView(ListView):
+class SearchListView(KeysetPaginationMixin, CachedResultsMixin, ListView):
     model = Listing
     template_name = 'search/results.html'
     paginate_by = 10
+    cache_namespace = 'search'
+    # Broad queries can match most of the catalog, so only the pks of the
+    # shallow pages are cached, and matches are counted up to a limit
+    max_cached_results = KeysetPaginationMixin.shallow_pages * paginate_by
+    max_count = 1000
 
     def get_queryset(self):
         q = self.request.GET.get('q', '')
-        qs = Listing.objects.unsold()
+        qs = Listing.objects.unsold().for_display()
 
         if q:
             query = SearchQuery(q)
-            qs = qs.annotate(rank=SearchRank(
-                    F('search_vector'), query
+            # ts_rank returns a real, which is cast so that ranks can be
+            # compared exactly with those in pagination cursors
+            qs = qs.annotate(rank=Cast(
+                    SearchRank(F('search_vector'), query), FloatField()
                 )).filter(search_vector=query).order_by('-rank')
         else:
-            qs = qs.none()
+            # Annotated all the same, as results are ordered by rank
+            qs = qs.annotate(rank=Value(0.0, FloatField())).none()
 
         self.q = q
-        self.total = len(qs)
 
         return qs
 
+    def get_cache_params(self):
+        if not self.q:
+            return None
+        return {'q': ' '.join(self.q.split())}
+
+    def get_keyset(self):
+        return ('-rank', '-id')
+
     def get_context_data(self, **kwargs):
         """
         Captures some additional variables for display in the template
         """
         context = super().get_context_data(**kwargs)
+        # Only generated for the current page
+        add_headlines(context['object_list'], self.q)
+        # Counted up to one past `max_count`, which is displayed as e.g. 1000+
+        count = context['paginator'].count
         context.update({
             'q': self.q,
-            'total': self.total
+            'total': min(count, self.max_count),
+            'total_capped': count > self.max_count
         })
         return context
+
+
+def autocomplete(request):
+    """
+    Returns the listing names, categories and materials matching the `q`
+    prefix as JSON, for search-as-you-type
+    """
+    q = request.GET.get('q', '')[:50]
+    if len(q.strip()) < 2:
+        results = []
+    else:
+        results = get_suggestions(q)
+    response = JsonResponse({'results': results})
+    patch_cache_control(response, public=True, max_age=60)
+    return response
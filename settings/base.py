@@ -51,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'common.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -150,10 +151,14 @@ STATICFILES_FINDERS = (
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 LISTING_MEDIA = 'listings'
+# Widths of the resized derivatives generated for uploaded pictures
+PICTURE_WIDTHS = [320, 640, 1280]
 
 # Messages settings
 
-MESSAGE_STORAGE = 'django.contrib.messages.storage.session.SessionStorage'
+# Messages are stored in a cookie where possible, so that flashing messages
+# doesn't create or write to sessions
+MESSAGE_STORAGE = 'django.contrib.messages.storage.fallback.FallbackStorage'
 
 MESSAGE_TAGS = {
     message_constants.DEBUG: 'debug',
@@ -178,6 +183,10 @@ CACHES = {
     }
 }
 
+# Expiry, in seconds, of cached catalog query results. These are invalidated
+# whenever the catalog changes, so can be kept for a long time
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+
 # Session settings
 
 SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
@@ -291,6 +300,8 @@ CART_KEY = 'CART'
 # Expiry time, in seconds, before cart items are removed and returned to stock
 CART_TIMEOUT = 3600
 CART_TIMEOUT_KEY = 'CART_TIMEOUT'
+# Minimum interval, in seconds, between cart activity timestamp updates
+CART_TIMEOUT_REFRESH = 60
 
 # ipware settings
 PROXY_TRUSTED_IPS = os.environ.get('PROXY_TRUSTED_IPS').split(',')
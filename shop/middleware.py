@@ -5,7 +5,6 @@ from django.shortcuts import redirect
 from django.http import HttpResponseServerError
 from django.contrib import messages
 from merchant.models import SquareConfig
-from cart.cart import Cart
 from .utils import cancel_order
 from .models import Order
 
@@ -75,9 +74,8 @@ class OrderTimeoutMiddleware(ShopBaseMiddleware):
         if now - active > self.timeout and status == Order.Status.UNPAID:
             order_number = session[self.key].get('number')
             order = Order.objects.get(number=order_number)
-            cart = Cart(session)
             if order is not None:
-                cancel_order(order, cart, self.key, session)
+                cancel_order(order, request.cart, self.key, session)
             messages.error(
                 request, 'Your order has been canceled due to inactivity'
             )
@@ -7,6 +7,7 @@ from django.db.models import signals
 from django.dispatch import receiver
 from localflavor.us.models import USStateField, USZipCodeField
 from common.models import BaseCustomer
+from cart.models import Reservation
 from .managers import OrderManager, PaymentManager
 
 
@@ -62,6 +63,8 @@ class Order(BaseCustomer):
     def finalize(self, session):
         self.status = self.Status.PAID
         self.save()
+        # Listings have been paid for, so their reservations must not expire
+        Reservation.objects.filter(listing__order=self).delete()
         del session[settings.CART_KEY]
         del session[settings.ORDER_KEY]
 
@@ -22,7 +22,6 @@ from django.views.generic.base import ContextMixin
 from django.views.generic.detail import SingleObjectMixin
 from square.client import Client
 from common.tasks import notify_admins
-from cart.cart import Cart
 from .models import Order, Payment
 from .forms import OrderForm
 from .utils import cancel_order
@@ -55,7 +54,7 @@ class ProgressMixin(ContextMixin):
 
 class OrderMixin(ProgressMixin, View):
     """
-    Instantiates session cart for order views
+    Retrieves the request's session cart for order views
     """
 
     http_method_names = ['get', 'post']
@@ -63,12 +62,20 @@ class OrderMixin(ProgressMixin, View):
     def setup(self, request, *args, **kwargs):
         super().setup(request, *args, **kwargs)
         self.key = getattr(settings, 'ORDER_KEY', 'ORDER')
-        self.cart = Cart(self.request.session)
+        self.cart = request.cart
 
     def dispatch(self, request, *args, **kwargs):
         """
-        Ensures that a non-empty cart exists for the current session
+        Ensures that a non-empty cart exists for the current session, after
+        removing any items whose reservation the session no longer holds, so
+        they can't be ordered
         """
+        if self.cart.verify():
+            messages.warning(
+                request,
+                'Some items in your cart are no longer available and have '
+                'been removed'
+            )
         if self.cart.is_empty:
             raise Http404()
         return super().dispatch(request, *args, **kwargs)